@@ -18,6 +18,13 @@ setup(name='tap-toggl',
         "dev": [
             "pylint",
             "ipdb",
+            "httpx[http2]==0.28.1",
+        ],
+        "async": [
+            "httpx[http2]==0.28.1",
+        ],
+        "fast-output": [
+            "orjson",
         ]
     },
       entry_points='''
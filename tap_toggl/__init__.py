@@ -8,9 +8,7 @@ import json
 import sys
 import singer
 from singer import metadata
-from tap_toggl.toggl import Toggl
 from tap_toggl.discover import discover_streams
-from tap_toggl.sync import sync_stream
 from tap_toggl.streams import STREAMS
 
 
@@ -25,9 +23,54 @@ REQUIRED_CONFIG_KEYS = [
 ]
 
 
-def do_discover(client):
+def build_client(config):
+    # Imported here so discovery and --help do not load the HTTP client stack.
+    from tap_toggl.toggl import Toggl, DEFAULT_POOL_SIZE, DEFAULT_REQUEST_TIMEOUT, DEFAULT_MAX_WORKERS, DEFAULT_REPORTS_PAGE_SIZE
+    from tap_toggl.windows import DEFAULT_TARGET_PAGES
+    from tap_toggl.cache import DEFAULT_CACHE_SIZE
+    from tap_toggl.http_cache import DEFAULT_HTTP_CACHE_MAX_BYTES
+
+    creds = {
+        "api_token": config['api_token'],
+        "trailing_days": config['detailed_report_trailing_days'],
+        "user_agent": config['user_agent'],
+        "start_date": config['start_date'],
+        "pool_size": config.get('pool_size', DEFAULT_POOL_SIZE),
+        "request_timeout": config.get('request_timeout', DEFAULT_REQUEST_TIMEOUT),
+        "keep_alive": config.get('keep_alive', True),
+        "max_workers": config.get('max_workers', DEFAULT_MAX_WORKERS),
+        "fan_out_order": config.get('fan_out_order', 'ordered'),
+        "report_workers": config.get('report_workers'),
+        "max_concurrent_requests": config.get('max_concurrent_requests'),
+        "max_requests_per_second": config.get('max_requests_per_second'),
+        "request_burst": config.get('request_burst'),
+        "latency_target": config.get('latency_target'),
+        "server_side_filters": config.get('server_side_filters', True),
+        "reports_api": config.get('reports_api', 'v2'),
+        "reports_page_size": config.get('reports_page_size', DEFAULT_REPORTS_PAGE_SIZE),
+        "report_target_pages": config.get('report_target_pages', DEFAULT_TARGET_PAGES),
+        "stream_json": config.get('stream_json', False),
+        "request_cache_size": config.get('request_cache_size', DEFAULT_CACHE_SIZE),
+        "http_metrics": config.get('http_metrics', True),
+        "http_cache_dir": config.get('http_cache_dir'),
+        "http_cache_max_bytes": config.get('http_cache_max_bytes', DEFAULT_HTTP_CACHE_MAX_BYTES),
+        "http_cache_bypass": config.get('http_cache_bypass', False)
+    }
+
+    engine = config.get('client_engine', 'requests')
+    if engine == 'async':
+        # Optional dependency, installed with `pip install tap-toggl[async]`.
+        from tap_toggl.async_toggl import AsyncToggl
+        return AsyncToggl(**creds)
+    if engine != 'requests':
+        raise ValueError("client_engine must be 'requests' or 'async'")
+    return Toggl(**creds)
+
+
+def do_discover():
+    # Discovery only reads the bundled schemas, so it needs no client or network access.
     logger.info("Starting discover")
-    catalog = {"streams": discover_streams(client)}
+    catalog = {"streams": discover_streams()}
     json.dump(catalog, sys.stdout, indent=2)
     logger.info("Finished discover")
 
@@ -55,30 +98,69 @@ def ensure_credentials_are_authorized(client):
     client.is_authorized()
 
 
-def do_sync(client, catalog, state):
+def build_checkpointer(config, writer):
+    from tap_toggl.sync import Checkpointer, DEFAULT_CHECKPOINT_RECORDS, DEFAULT_CHECKPOINT_SECONDS
+    return Checkpointer(config.get('state_checkpoint_records', DEFAULT_CHECKPOINT_RECORDS),
+                        config.get('state_checkpoint_seconds', DEFAULT_CHECKPOINT_SECONDS),
+                        writer=writer)
+
+
+def build_output_writer(config):
+    from tap_toggl.output import build_writer, DEFAULT_BUFFER_BYTES, DEFAULT_FLUSH_SECONDS
+    return build_writer(config.get('output_engine', 'singer'),
+                        config.get('output_buffer_bytes', DEFAULT_BUFFER_BYTES),
+                        config.get('output_flush_seconds', DEFAULT_FLUSH_SECONDS))
+
+
+def sync_selected_stream(client, stream, state, config, writer):
+    from tap_toggl.sync import sync_stream
+    stream_name = stream.tap_stream_id
+    mdata = metadata.to_map(stream.metadata)
+    key_properties = metadata.get(mdata, (), 'table-key-properties')
+    writer.write_schema(stream_name, stream.schema.to_dict(), key_properties)
+    logger.info("%s: Starting sync", stream_name)
+    instance = STREAMS[stream_name](client, config)
+    instance.stream = stream
+    counter_value = sync_stream(state, instance, build_checkpointer(config, writer), writer)
+    writer.write_state(state)
+    logger.info("%s: Completed sync (%s rows)", stream_name, counter_value)
+
+
+def do_sync(client, catalog, state, config=None):
+    from tap_toggl.sync import sync_concurrently, DEFAULT_STREAM_WORKERS
+    config = config or {}
     ensure_credentials_are_authorized(client)
     selected_stream_names = get_selected_streams(catalog)
     populate_class_schemas(catalog, selected_stream_names)
+    writer = build_output_writer(config)
+    stream_workers = int(config.get('stream_workers', DEFAULT_STREAM_WORKERS))
 
+    selected = []
     for stream in catalog.streams:
-        stream_name = stream.tap_stream_id
-
-        mdata = metadata.to_map(stream.metadata)
-
-        if stream_name not in selected_stream_names:
-            logger.info("%s: Skipping - not selected", stream_name)
+        if stream.tap_stream_id not in selected_stream_names:
+            logger.info("%s: Skipping - not selected", stream.tap_stream_id)
             continue
-
-        key_properties = metadata.get(mdata, (), 'table-key-properties')
-        singer.write_schema(stream_name, stream.schema.to_dict(), key_properties)
-        logger.info("%s: Starting sync", stream_name)
-        instance = STREAMS[stream_name](client)
-        instance.stream = stream
-        counter_value = sync_stream(state, instance)
-        singer.write_state(state)
-        logger.info("%s: Completed sync (%s rows)", stream_name, counter_value)
-
-    singer.write_state(state)
+        selected.append(stream)
+
+    try:
+        if stream_workers > 1 and len(selected) > 1:
+            # Streams do not depend on each other; they share the client and
+            # its workspace topology, which is fetched once up front.
+            logger.info("Syncing %s streams, %s at a time", len(selected), stream_workers)
+            client.workspace_ids # pylint: disable=pointless-statement
+            tasks = [(stream.tap_stream_id,
+                      lambda stream_state, stream_writer, stream=stream:
+                      sync_selected_stream(client, stream, stream_state, config, stream_writer))
+                     for stream in selected]
+            sync_concurrently(state, tasks, writer, stream_workers)
+        else:
+            for stream in selected:
+                sync_selected_stream(client, stream, state, config, writer)
+
+        writer.write_state(state)
+    finally:
+        writer.flush()
+    client.log_stats()
     logger.info("Finished sync")
 
 
@@ -86,19 +168,11 @@ def do_sync(client, catalog, state):
 def main():
     parsed_args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
 
-    creds = {
-        "api_token": parsed_args.config['api_token'],
-        "trailing_days": parsed_args.config['detailed_report_trailing_days'],
-        "user_agent": parsed_args.config['user_agent'],
-        "start_date": parsed_args.config['start_date']
-    }
-    client = Toggl(**creds)
-
     if parsed_args.discover:
-        do_discover(client)
+        do_discover()
     elif parsed_args.catalog:
         state = parsed_args.state or {}
-        do_sync(client, parsed_args.catalog, state)
+        do_sync(build_client(parsed_args.config), parsed_args.catalog, state, parsed_args.config)
 
 
 
@@ -0,0 +1,202 @@
+#
+# Module dependencies.
+#
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+import backoff
+import httpx
+from tap_toggl.toggl import Toggl, PageEnd, logger, _page_of, MAX_THROTTLED_RETRIES
+
+
+# Maximum number of finished endpoints waiting for the sync consumer.
+BRIDGE_BUFFER_SIZE = 64
+
+_DONE = object()
+
+
+def request_too_large(error):
+  logger.warning('Request {type} exception caught:  {error}'.format(type=error.__class__.__name__, error=error))
+  if isinstance(error, httpx.HTTPStatusError):
+    if error.response.status_code == 503:
+      return True
+  return False
+
+
+def _record_backoff(details):
+  # backoff handler: args are (client, http_client, url).
+  toggl, _, url = details['args'][:3]
+  toggl.telemetry.retry(url, details.get('wait'))
+
+
+def iterate_in_background(produce):
+  """
+  Adapt an asyncio producer to the synchronous generator interface used by
+  `Stream.sync` and `sync_stream`.
+
+  `produce` is a coroutine function taking a `put` coroutine. It runs on a
+  private event loop in a background thread and hands over lists of items,
+  which are yielded here in the order they were put.
+  """
+  results = queue.Queue(maxsize=BRIDGE_BUFFER_SIZE)
+
+  async def put(items):
+    # Block an executor thread, not the event loop, when the consumer lags.
+    await asyncio.get_running_loop().run_in_executor(None, results.put, items)
+
+  def run():
+    try:
+      asyncio.run(produce(put))
+    except BaseException as error: # pylint: disable=broad-except
+      results.put(error)
+    finally:
+      results.put(_DONE)
+
+  thread = threading.Thread(target=run, name='toggl-async-engine', daemon=True)
+  thread.start()
+  while True:
+    items = results.get()
+    if items is _DONE:
+      break
+    if isinstance(items, BaseException):
+      raise items
+    for item in items:
+      yield item
+  thread.join()
+
+
+"""
+Toggl client that fetches workspace endpoints and v2 report windows
+concurrently on an asyncio event loop. Single requests (`workspaces`,
+`is_authorized`) and Reports v3 windows stay on the pooled requests
+session and worker pool.
+"""
+class AsyncToggl(Toggl):
+
+  def __init__(self, *args, **kwargs):
+    self._transport = None
+    super().__init__(*args, **kwargs)
+
+
+  def _build_async_client(self):
+    keepalive = self.pool_size if self.keep_alive else 0
+    limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=keepalive)
+    return httpx.AsyncClient(http2=True,
+                             auth=(self.api_token, 'api_token'),
+                             timeout=self.request_timeout,
+                             limits=limits,
+                             transport=self._transport)
+
+
+  @backoff.on_exception(backoff.expo,
+                        httpx.HTTPError,
+                        giveup=request_too_large,
+                        on_backoff=_record_backoff)
+  async def _aget(self, client, url):
+    logger.info("Hitting {url}".format(url=url))
+    cacheable = self._http_cacheable(url)
+    entry = self.http_cache.lookup(url) if cacheable else None
+    request_headers = self.http_cache.conditional_headers(entry) if cacheable else None
+    throttled_retries = 0
+    while True:
+      await self.governor.acquire_async()
+      status_code, headers = None, None
+      start = time.monotonic()
+      try:
+        response = await client.get(url, headers=request_headers)
+        status_code, headers = response.status_code, response.headers
+      finally:
+        elapsed = time.monotonic() - start
+        self.governor.release(status_code, headers, elapsed)
+        self.telemetry.request(url, status_code, elapsed)
+      self.telemetry.received(url, len(response.content))
+      if response.status_code != 429 or throttled_retries >= MAX_THROTTLED_RETRIES:
+        break
+      throttled_retries += 1
+      self.telemetry.retry(url, max(self.governor.paused_until - time.monotonic(), 0.0))
+    if cacheable:
+      return self._revalidated(url, entry, response)
+    response.raise_for_status()
+    return response.json()
+
+
+  async def _aget_response(self, client, url, key=None, markers=False, paging=None):
+    # Mirrors `Toggl._get_response`: pages of one endpoint are sequential.
+    if paging is not None:
+      job = url
+      page = _page_of(url)
+      if page is None:
+        page = paging.first_page
+      while True:
+        res = await self._aget(client, self._paginate_endpoint(url, page, paging))
+        res = [] if res is None else res
+        data = res[paging.key] if paging.key is not None else res
+        logger.info('Endpoint returned {length} rows.'.format(length=len(data)))
+        for item in data:
+          yield item
+        page += 1
+        last = paging.is_last(len(data))
+        if markers:
+          yield PageEnd(job, None if last else page, len(data))
+        if last:
+          break
+
+    else:
+      res = await self._aget(client, url)
+      res = [] if res is None else res
+      data = res[key] if key is not None else res
+      logger.info('Endpoint returned {length} rows.'.format(length=len(data)))
+      for item in data:
+        yield item
+
+
+  async def aget_from_endpoints(self, endpoints, key=None, markers=False, paging=None):
+    """
+    Async generator yielding one list of items per endpoint. Endpoints are
+    scheduled through a sliding window of twice `max_concurrent_requests`
+    tasks, so finished results waiting for the consumer stay bounded.
+    """
+    in_flight = asyncio.Semaphore(self.max_concurrent_requests)
+    window = self.max_concurrent_requests * 2
+    endpoints = iter(endpoints)
+    async with self._build_async_client() as client:
+
+      async def fetch(endpoint):
+        async with in_flight:
+          return [item async for item in self._aget_response(client, endpoint, key, markers, paging)]
+
+      pending = deque()
+
+      def schedule():
+        while len(pending) < window:
+          endpoint = next(endpoints, None)
+          if endpoint is None:
+            return
+          pending.append(asyncio.ensure_future(fetch(endpoint)))
+
+      try:
+        schedule()
+        while pending:
+          if self.fan_out_order == 'ordered':
+            task = pending.popleft()
+          else:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            task = done.pop()
+            pending.remove(task)
+          items = await task
+          schedule()
+          yield items
+      finally:
+        for task in pending:
+          task.cancel()
+
+
+  def _get_from_endpoints(self, endpoints, column_name=None, bookmark=None, key=None, max_workers=None, markers=False, paging=None):
+    async def produce(put):
+      async for items in self.aget_from_endpoints(endpoints, key=key, markers=markers, paging=paging):
+        await put(items)
+
+    return iterate_in_background(produce)
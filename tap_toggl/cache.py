@@ -0,0 +1,42 @@
+#
+# Module dependencies.
+#
+
+import copy
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 128
+
+
+class ResponseCache():
+  """
+  Run-scoped LRU cache of decoded JSON responses keyed by URL. Holds at
+  most `max_entries` responses and hands out deep copies, since records
+  are modified in place further down the pipeline.
+  """
+
+  def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+    self.max_entries = max(int(max_entries), 0)
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+
+  def get(self, url, fetch):
+    with self._lock:
+      if url in self.entries:
+        self.entries.move_to_end(url)
+        self.hits += 1
+        return copy.deepcopy(self.entries[url])
+      self.misses += 1
+
+    value = fetch(url)
+    if self.max_entries:
+      with self._lock:
+        self.entries[url] = value
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.max_entries:
+          self.entries.popitem(last=False)
+    return copy.deepcopy(value)
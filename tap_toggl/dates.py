@@ -0,0 +1,49 @@
+#
+# Module dependencies.
+#
+
+import datetime
+import functools
+from singer import utils
+
+# Distinct timestamp strings remembered by the parsers below. Bookmarks,
+# window bounds and `at` values repeat across many records.
+DATETIME_MEMO_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=DATETIME_MEMO_SIZE)
+def _parse_iso(value):
+    try:
+        parsed = datetime.datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        return utils.strptime_with_tz(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def parse_datetime(value):
+    """
+    Parse an ISO-8601 timestamp into a timezone-aware datetime, treating
+    naive values as UTC like `singer.utils.strptime_with_tz`. Uses
+    `datetime.fromisoformat` and falls back to the general parser for
+    anything it does not accept. Results are memoized per string.
+    """
+    if not isinstance(value, str):
+        return utils.strptime_with_tz(value)
+    return _parse_iso(value)
+
+
+def utc_midnight(value):
+    """ Midnight UTC of the calendar date `value` falls on, as `strptime_with_tz` reads a bare `%Y-%m-%d`. """
+    return value.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=datetime.timezone.utc)
+
+
+@functools.lru_cache(maxsize=DATETIME_MEMO_SIZE)
+def format_datetime(value):
+    """
+    The string `singer.Transformer` writes for a `date-time` string: the
+    instant in UTC as `%Y-%m-%dT%H:%M:%S.%fZ`. Raises like the parser on
+    values it cannot read.
+    """
+    return utils.strftime(parse_datetime(value).astimezone(datetime.timezone.utc))
@@ -0,0 +1,49 @@
+#
+# Module dependencies.
+#
+
+import hashlib
+import itertools
+import json
+
+DEFAULT_DEDUP_ENTRIES = 1000000
+
+
+class RecordDeduplicator():
+    """
+    Remembers the records emitted in this run by key, with a 64-bit
+    fingerprint of their replication value, and reports repeats of the same
+    version. A record whose replication value changed is not a duplicate.
+
+    At most `max_entries` keys are kept; past that the older half is
+    forgotten, so memory stays bounded and a very old duplicate may be
+    emitted again, which targets absorb by primary key. `max_entries` of 0
+    disables deduplication.
+    """
+
+    def __init__(self, max_entries=DEFAULT_DEDUP_ENTRIES):
+        self.max_entries = max(int(max_entries), 0)
+        self.seen = {}
+        self.suppressed = 0
+
+    def is_duplicate(self, key, version):
+        if not self.max_entries or key is None:
+            return False
+        fingerprint = hash(version)
+        if self.seen.get(key) == fingerprint:
+            self.suppressed += 1
+            return True
+        self.seen.pop(key, None)
+        self.seen[key] = fingerprint
+        if len(self.seen) > self.max_entries:
+            self.seen = dict(itertools.islice(self.seen.items(), len(self.seen) // 2, None))
+        return False
+
+
+def record_digest(record):
+    """
+    Short fingerprint of a record's content, stable across processes (unlike
+    `hash`), so it can be kept in state and compared on the next run.
+    """
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
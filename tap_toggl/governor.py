@@ -0,0 +1,179 @@
+#
+# Module dependencies.
+#
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import singer
+
+logger = singer.get_logger()
+
+# Seconds to wait after a 429 that carries no usable Retry-After header.
+DEFAULT_RETRY_AFTER = 1.0
+# Seconds between checks while every concurrency slot is taken.
+SLOT_POLL_INTERVAL = 0.05
+
+QUOTA_REMAINING_HEADER = 'X-Toggl-Quota-Remaining'
+QUOTA_RESETS_IN_HEADER = 'X-Toggl-Quota-Resets-In'
+
+
+def parse_retry_after(value):
+  """ Return the delay in seconds described by a `Retry-After` header, or None. """
+  if value is None:
+    return None
+  try:
+    return max(float(value), 0.0)
+  except ValueError:
+    pass
+  try:
+    retry_at = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  if retry_at.tzinfo is None:
+    retry_at = retry_at.replace(tzinfo=timezone.utc)
+  return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _as_number(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+
+class RequestGovernor():
+  """
+  Central admission control for every request made by the Toggl clients.
+
+  Combines a token bucket (`rate` requests per second with `burst`
+  capacity), a pause honouring `Retry-After` on 429 responses and the Toggl
+  quota headers, and an AIMD concurrency limit: the limit halves on
+  throttling or slow responses and grows by one after a full window of
+  healthy ones, never exceeding `max_concurrency`.
+  """
+
+  def __init__(self, max_concurrency, rate=None, burst=None, latency_target=None, min_concurrency=1):
+    self.max_concurrency = max(int(max_concurrency), 1)
+    self.min_concurrency = min(max(int(min_concurrency), 1), self.max_concurrency)
+    self.rate = float(rate) if rate else None
+    self.burst = float(burst) if burst else max(self.rate or 1.0, 1.0)
+    self.latency_target = float(latency_target) if latency_target else None
+
+    self.limit = self.max_concurrency
+    self.in_flight = 0
+    self.tokens = self.burst
+    self.refilled_at = time.monotonic()
+    self.paused_until = 0.0
+    self.quota_remaining = None
+    self.healthy_streak = 0
+
+    self.requests = 0
+    self.throttled = 0
+    self.slow = 0
+    self.wait_seconds = 0.0
+    self._lock = threading.Lock()
+
+
+  def _refill(self, now):
+    if self.rate is None:
+      return
+    self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+    self.refilled_at = now
+
+
+  def try_acquire(self):
+    """ Take a slot and return 0, or return the seconds to wait before retrying. """
+    with self._lock:
+      now = time.monotonic()
+      if now < self.paused_until:
+        return self.paused_until - now
+      if self.in_flight >= self.limit:
+        return SLOT_POLL_INTERVAL
+      self._refill(now)
+      if self.rate is not None and self.tokens < 1:
+        return (1 - self.tokens) / self.rate
+      if self.rate is not None:
+        self.tokens -= 1
+      self.in_flight += 1
+      return 0
+
+
+  def acquire(self):
+    while True:
+      delay = self.try_acquire()
+      if not delay:
+        return
+      self._record_wait(delay)
+      time.sleep(delay)
+
+
+  async def acquire_async(self):
+    while True:
+      delay = self.try_acquire()
+      if not delay:
+        return
+      self._record_wait(delay)
+      await asyncio.sleep(delay)
+
+
+  def _record_wait(self, delay):
+    with self._lock:
+      self.wait_seconds += delay
+
+
+  def release(self, status_code=None, headers=None, elapsed=None):
+    """ Return a slot and adapt the limits to what the response told us. """
+    headers = headers or {}
+    with self._lock:
+      now = time.monotonic()
+      self.in_flight = max(self.in_flight - 1, 0)
+      self.requests += 1
+
+      remaining = _as_number(headers.get(QUOTA_REMAINING_HEADER))
+      resets_in = _as_number(headers.get(QUOTA_RESETS_IN_HEADER))
+      if remaining is not None:
+        self.quota_remaining = remaining
+        if remaining <= 0 and resets_in is not None:
+          self.paused_until = max(self.paused_until, now + resets_in)
+
+      if status_code == 429:
+        self.throttled += 1
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after is None:
+          retry_after = resets_in if resets_in is not None else DEFAULT_RETRY_AFTER
+        self.paused_until = max(self.paused_until, now + retry_after)
+        self._decrease()
+      elif self.latency_target is not None and elapsed is not None and elapsed > self.latency_target:
+        self.slow += 1
+        self._decrease()
+      elif status_code is not None and status_code < 500:
+        self.healthy_streak += 1
+        if self.healthy_streak >= self.limit and self.limit < self.max_concurrency:
+          self.limit += 1
+          self.healthy_streak = 0
+
+
+  def _decrease(self):
+    self.limit = max(self.min_concurrency, self.limit // 2)
+    self.healthy_streak = 0
+
+
+  def stats(self):
+    with self._lock:
+      return {
+        'requests': self.requests,
+        'throttled': self.throttled,
+        'slow': self.slow,
+        'wait_seconds': round(self.wait_seconds, 3),
+        'concurrency_limit': self.limit,
+        'quota_remaining': self.quota_remaining
+      }
+
+
+  def log_stats(self):
+    logger.info('Request governor: {requests} requests, {throttled} throttled, {slow} slow, '
+                '{wait_seconds}s waiting, concurrency limit {concurrency_limit}, '
+                'quota remaining {quota_remaining}.'.format(**self.stats()))
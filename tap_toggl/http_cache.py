@@ -0,0 +1,172 @@
+#
+# Module dependencies.
+#
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+logger = logging.getLogger()
+
+
+class HttpCache():
+  """
+  On-disk store of response bodies and their validators (`ETag`,
+  `Last-Modified`) for conditional GETs that survive between runs.
+
+  Entries are keyed by a hash of the API token and URL, so one directory
+  can serve several accounts without mixing their data. Each entry is one
+  file: a JSON header line with the validators, then the raw body. When the
+  directory grows past `max_bytes`, the least recently used entries are
+  removed. With `bypass`, stored entries are ignored but fresh responses
+  are still saved for the next run.
+  """
+
+  def __init__(self, directory, namespace='', max_bytes=DEFAULT_HTTP_CACHE_MAX_BYTES, bypass=False):
+    self.directory = directory
+    self.namespace = namespace or ''
+    self.max_bytes = max(int(max_bytes), 0)
+    self.bypass = bypass
+    self.not_modified = 0
+    self.stored = 0
+    self.evicted = 0
+    self._index = None
+    self._lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+
+
+  def _key(self, url):
+    return hashlib.sha256('{}\0{}'.format(self.namespace, url).encode('utf-8')).hexdigest()
+
+
+  def _path(self, key):
+    return os.path.join(self.directory, key + '.cache')
+
+
+  def _load_index(self):
+    # {key: [size, last used]}, scanned from the directory on first use.
+    if self._index is None:
+      self._index = {}
+      for name in os.listdir(self.directory):
+        if not name.endswith('.cache'):
+          continue
+        try:
+          stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+          continue
+        self._index[name[:-len('.cache')]] = [stat.st_size, stat.st_mtime]
+    return self._index
+
+
+  def lookup(self, url):
+    """ The stored `(validators, body)` for `url`, or None. """
+    if self.bypass:
+      return None
+    key = self._key(url)
+    path = self._path(key)
+    try:
+      with open(path, 'rb') as f:
+        header, _, body = f.read().partition(b'\n')
+      validators = json.loads(header)
+    except FileNotFoundError:
+      return None
+    except (OSError, ValueError):
+      logger.warning('Discarding unreadable HTTP cache entry {path}.'.format(path=path))
+      self._remove(key)
+      return None
+    if validators.get('url') != url:
+      return None
+    return validators, body
+
+
+  def conditional_headers(self, entry):
+    if entry is None:
+      return {}
+    validators, _ = entry
+    headers = {}
+    if validators.get('etag'):
+      headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+      headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+  def hit(self, url):
+    """ Record that the server confirmed the stored body of `url` is current. """
+    key = self._key(url)
+    with self._lock:
+      self.not_modified += 1
+      entry = self._load_index().get(key)
+      if entry is not None and self._touch(key):
+        entry[1] = time.time()
+
+
+  def _touch(self, key):
+    try:
+      os.utime(self._path(key))
+      return True
+    except OSError:
+      return False
+
+
+  def store(self, url, headers, body):
+    """ Save `body` if the response carries a validator; otherwise drop any stale entry. """
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    key = self._key(url)
+    if not etag and not last_modified:
+      self._remove(key)
+      return
+    header = json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified}).encode('utf-8')
+    content = header + b'\n' + body
+    if len(content) > self.max_bytes:
+      self._remove(key)
+      return
+    # Written to a temporary file first so a concurrent or interrupted run
+    # never reads half an entry.
+    fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+      os.replace(temporary, self._path(key))
+    except OSError:
+      if os.path.exists(temporary):
+        os.remove(temporary)
+      raise
+    with self._lock:
+      index = self._load_index()
+      index[key] = [len(content), os.path.getmtime(self._path(key))]
+      self.stored += 1
+      self._evict(index, keep=key)
+
+
+  def _evict(self, index, keep):
+    total = sum(size for size, _ in index.values())
+    for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+      if total <= self.max_bytes:
+        break
+      if key == keep:
+        continue
+      try:
+        os.remove(self._path(key))
+      except FileNotFoundError:
+        pass
+      del index[key]
+      total -= size
+      self.evicted += 1
+
+
+  def _remove(self, key):
+    try:
+      os.remove(self._path(key))
+    except FileNotFoundError:
+      pass
+    with self._lock:
+      if self._index is not None:
+        self._index.pop(key, None)
@@ -0,0 +1,129 @@
+#
+# Module dependencies.
+#
+
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+# Drop the consumed part of the buffer once it grows past this many characters.
+COMPACT_AFTER = 64 * 1024
+
+
+class _Reader():
+  """ Incremental reader over an iterable of byte chunks. """
+
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+    self.decoder = codecs.getincrementaldecoder('utf-8')()
+    self.json = json.JSONDecoder()
+    self.buf = ''
+    self.pos = 0
+    self.eof = False
+
+
+  def _fill(self):
+    if self.eof:
+      return False
+    if self.pos > COMPACT_AFTER:
+      self.buf = self.buf[self.pos:]
+      self.pos = 0
+    for chunk in self.chunks:
+      text = self.decoder.decode(chunk)
+      if text:
+        self.buf += text
+        return True
+    self.buf += self.decoder.decode(b'', final=True)
+    self.eof = True
+    return False
+
+
+  def peek(self):
+    """ Return the next non-whitespace character without consuming it, or None at the end. """
+    while True:
+      while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+        self.pos += 1
+      if self.pos < len(self.buf):
+        return self.buf[self.pos]
+      if not self._fill():
+        return None
+
+
+  def expect(self, char):
+    if self.peek() != char:
+      raise ValueError('Expected {!r} at position {} of JSON stream'.format(char, self.pos))
+    self.pos += 1
+
+
+  def value(self):
+    """ Decode the next complete JSON value, reading more chunks as needed. """
+    self.peek()
+    while True:
+      try:
+        value, end = self.json.raw_decode(self.buf, self.pos)
+      except json.JSONDecodeError:
+        if not self._fill():
+          raise
+        continue
+      # A number at the end of the buffer may continue in the next chunk.
+      if end == len(self.buf) and self._fill():
+        continue
+      self.pos = end
+      return value
+
+
+  def array(self):
+    self.expect('[')
+    if self.peek() == ']':
+      self.pos += 1
+      return
+    while True:
+      yield self.value()
+      separator = self.peek()
+      self.pos += 1
+      if separator == ']':
+        return
+      if separator != ',':
+        raise ValueError('Expected "," or "]" in JSON array, got {!r}'.format(separator))
+
+
+def iter_items(chunks, key=None):
+  """
+  Yield the items of a JSON array while its bytes are still arriving.
+
+  With `key`, the array is the value of that member of a top-level object
+  (other members are skipped); otherwise the document must be an array.
+  Only one item is held in memory at a time, whatever the response size.
+  """
+  reader = _Reader(chunks)
+  first = reader.peek()
+  if first is None:
+    return
+
+  if key is None:
+    if first == '[':
+      yield from reader.array()
+    elif reader.value() is not None:
+      raise ValueError('Expected a JSON array')
+    return
+
+  if first != '{':
+    if reader.value() is not None:
+      raise ValueError('Expected a JSON object with a {!r} member'.format(key))
+    return
+  reader.expect('{')
+  if reader.peek() == '}':
+    return
+  while True:
+    name = reader.value()
+    reader.expect(':')
+    if name == key and reader.peek() == '[':
+      yield from reader.array()
+    else:
+      reader.value()
+    separator = reader.peek()
+    reader.pos += 1
+    if separator == '}':
+      return
+    if separator != ',':
+      raise ValueError('Expected "," or "}" in JSON object, got {!r}'.format(separator))
@@ -0,0 +1,36 @@
+#
+# Module dependencies.
+#
+
+from singer import metadata
+
+
+def compile_projection(schema, mdata, keep=()):
+    """
+    Top-level fields a record keeps after `singer.Transformer`: properties
+    of the schema that are automatic, or not deselected and not
+    unsupported. Fields in `keep` are kept whether or not the schema lists
+    them, for the stream's own use before the record is transformed.
+    Returns None when the schema does not list its properties, in which
+    case records are passed through untouched.
+    """
+    properties = schema.get('properties')
+    if not properties or schema.get('patternProperties'):
+        return None
+    fields = []
+    for field_name in properties:
+        breadcrumb = ('properties', field_name)
+        inclusion = metadata.get(mdata, breadcrumb, 'inclusion')
+        if inclusion == 'automatic' or field_name in keep:
+            fields.append(field_name)
+        elif metadata.get(mdata, breadcrumb, 'selected') is not False and inclusion != 'unsupported':
+            fields.append(field_name)
+    fields.extend(field_name for field_name in keep if field_name and field_name not in properties)
+    return tuple(fields)
+
+
+def project(record, fields):
+    """ A copy of `record` holding only `fields`, in their order. """
+    if fields is None or not isinstance(record, dict):
+        return record
+    return {field_name: record[field_name] for field_name in fields if field_name in record}
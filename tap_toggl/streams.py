@@ -4,30 +4,40 @@
 # 
 
 import os
+import copy
 import json
 import datetime
+import functools
 import pytz
 import singer
 from singer import metadata
-from singer import utils
-from singer.metrics import Point
-from dateutil.parser import parse
+from singer import metrics
+from tap_toggl.dates import parse_datetime
+from tap_toggl.dedup import RecordDeduplicator, DEFAULT_DEDUP_ENTRIES, record_digest
+from tap_toggl.projection import compile_projection, project
 
 
 logger = singer.get_logger()
 KEY_PROPERTIES = ['id']
+DEFAULT_USERS_FULL_REFRESH_RUNS = 24
 
 
 def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
 
+@functools.lru_cache(maxsize=None)
+def _read_schema(name):
+    with open(get_abs_path("schemas/{}.json".format(name))) as f:
+        return json.load(f)
+
+
 def needs_parse_to_date(string):
     if isinstance(string, str):
-        try: 
-            parse(string)
+        try:
+            parse_datetime(string)
             return True
-        except ValueError:
+        except (OverflowError, ValueError):
             return False
     return False
 
@@ -41,14 +51,26 @@ class Stream():
     session_bookmark = None
 
 
-    def __init__(self, client=None):
+    def __init__(self, client=None, config=None):
         self.client = client
+        self.config = config or {}
+
+
+    def _parse_cached(self, attr, value):
+        # Bookmarks rarely change between records, so keep the last parsed
+        # value instead of parsing the same string for every comparison.
+        cached = getattr(self, attr, None)
+        if cached is None or cached[0] != value:
+            cached = (value, parse_datetime(value))
+            setattr(self, attr, cached)
+        return cached[1]
 
 
     def is_session_bookmark_old(self, value):
         if self.session_bookmark is None:
             return True
-        return utils.strptime_with_tz(value) > utils.strptime_with_tz(self.session_bookmark)
+        session_bookmark = self._parse_cached('_parsed_session_bookmark', self.session_bookmark)
+        return parse_datetime(value) > session_bookmark
 
 
     def update_session_bookmark_if_old(self, value):
@@ -71,14 +93,12 @@ class Stream():
             return True
         if value is None:
             return False
-        return utils.strptime_with_tz(value) > utils.strptime_with_tz(current_bookmark)
+        return parse_datetime(value) > self._parse_cached('_parsed_bookmark', current_bookmark)
 
 
     def load_schema(self):
-        schema_file = "schemas/{}.json".format(self.name)
-        with open(get_abs_path(schema_file)) as f:
-            schema = json.load(f)
-        return schema
+        # Each schema file is read once per process; callers get their own copy.
+        return copy.deepcopy(_read_schema(self.name))
 
 
     def load_metadata(self):
@@ -104,11 +124,23 @@ class Stream():
         return self.stream is not None
 
 
+    def projection(self):
+        # Fields the Transformer would keep; trimming records to them up front
+        # spares it from walking unselected, possibly nested, properties. The
+        # key and replication key are kept for bookmarks and deduplication
+        # even where the schema does not list them (`updated` in time_entries).
+        if self.stream is None:
+            return None
+        return compile_projection(self.stream.schema.to_dict(), metadata.to_map(self.stream.metadata),
+                                  keep=list(self.key_properties) + [self.replication_key])
+
+
     # The main sync function.
     def sync(self, state):
         get_data = getattr(self.client, self.name)
         bookmark = self.get_bookmark(state)
         res = get_data(self.replication_key, bookmark)
+        fields = self.projection()
 
         if self.replication_method == "INCREMENTAL":
             for item in res:
@@ -118,11 +150,11 @@ class Stream():
                     # must update bookmark when the entire stream is consumed.
                     # instead, we use a temporary `session_bookmark`.
                     self.update_session_bookmark_if_old(item[self.replication_key])
-                    yield (self.stream, item)
+                    yield (self.stream, project(item, fields))
 
         elif self.replication_method == "FULL_TABLE":
             for item in res:
-                yield (self.stream, item)
+                yield (self.stream, project(item, fields))
 
         else:
             raise Exception('Replication key not defined for {stream}'.format(self.name))
@@ -179,6 +211,37 @@ class Users(Stream):
     key_properties = [ "id" ]
 
 
+    def sync(self, state):
+        if not self.config.get('users_digest_mode'):
+            yield from super().sync(state)
+            return
+
+        # Digest mode: a digest of every user emitted is kept in state and
+        # only new or changed users are emitted, with a full refresh every
+        # `users_full_refresh_runs` runs. Digests are replaced once the
+        # stream completes, so an interrupted run re-emits on the next one.
+        previous = singer.get_bookmark(state, self.name, 'digests') or {}
+        runs = singer.get_bookmark(state, self.name, 'runs_since_full_refresh') or 0
+        every = int(self.config.get('users_full_refresh_runs', DEFAULT_USERS_FULL_REFRESH_RUNS))
+        full_refresh = not previous or bool(every and runs + 1 >= every)
+
+        digests = {}
+        unchanged = 0
+        for stream, item in super().sync(state):
+            key = str(item.get('id'))
+            digests[key] = record_digest(item)
+            if not full_refresh and previous.get(key) == digests[key]:
+                unchanged += 1
+                continue
+            yield (stream, item)
+
+        logger.info("%s: Skipped %s unchanged records%s", self.name, unchanged, " (full refresh)" if full_refresh else "")
+        metrics.log(logger, metrics.Point('counter', 'unchanged_records_suppressed', unchanged,
+                                          {metrics.Tag.endpoint: self.name}))
+        singer.write_bookmark(state, self.name, 'digests', digests)
+        singer.write_bookmark(state, self.name, 'runs_since_full_refresh', 0 if full_refresh else runs + 1)
+
+
 class WorkspaceUsers(Stream):
     name = "workspace_users"
     replication_method = "INCREMENTAL"
@@ -193,6 +256,33 @@ class TimeEntries(Stream):
     key_properties = [ "id" ]
 
 
+    def sync(self, state):
+        # The client sizes report windows from the density learned in
+        # earlier runs and updates this dict in place for the next run.
+        density = singer.get_bookmark(state, self.name, 'window_density') or {}
+        singer.write_bookmark(state, self.name, 'window_density', density)
+        self.client.window_density = density
+        # Finished windows and pages of an interrupted run, also updated in
+        # place, so checkpointed state lets a restart skip them.
+        progress = singer.get_bookmark(state, self.name, 'progress') or {}
+        singer.write_bookmark(state, self.name, 'progress', progress)
+        self.client.report_progress = progress
+
+        # Report windows and the trailing-days lookback can return the same
+        # entry more than once in a run; drop repeats before transforming.
+        deduplicator = RecordDeduplicator(self.config.get('dedup_max_entries', DEFAULT_DEDUP_ENTRIES))
+        for stream, item in super().sync(state):
+            if deduplicator.is_duplicate(item.get('id'), item.get(self.replication_key)):
+                continue
+            yield (stream, item)
+        logger.info("%s: Suppressed %s duplicate records", self.name, deduplicator.suppressed)
+        metrics.log(logger, metrics.Point('counter', 'duplicate_records_suppressed', deduplicator.suppressed,
+                                          {metrics.Tag.endpoint: self.name}))
+
+        # The bookmark now covers the whole range.
+        state['bookmarks'][self.name].pop('progress', None)
+
+
 
 STREAMS = {
     "workspaces": Workspaces,
@@ -3,25 +3,197 @@
 # Module dependencies.
 # 
 
+import copy
 import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import singer
 import singer.metrics as metrics
 from singer import metadata
 from singer import Transformer
+from singer.transform import NO_INTEGER_DATETIME_PARSING
+from tap_toggl.dates import format_datetime
+from tap_toggl.output import SingerWriter
 
 logger = singer.get_logger()
 
+DEFAULT_CHECKPOINT_RECORDS = 1000
+DEFAULT_CHECKPOINT_SECONDS = 60
+DEFAULT_STREAM_WORKERS = 1
+# Messages waiting for the single output writer when streams run concurrently.
+CHANNEL_SIZE = 10000
 
-def sync_stream(state, instance):
+
+class Checkpointer():
+    """
+    Decides when to emit STATE while records are written: every
+    `every_records` records or `every_seconds` seconds, whichever comes
+    first. Bookmarks only advance once a stream is fully consumed, so any
+    state written mid-stream is a safe resume point.
+    """
+
+    def __init__(self, every_records=DEFAULT_CHECKPOINT_RECORDS, every_seconds=DEFAULT_CHECKPOINT_SECONDS, writer=None):
+        self.writer = writer or SingerWriter()
+        self.every_records = max(int(every_records), 1)
+        self.every_seconds = float(every_seconds)
+        self.pending = 0
+        self.written_at = time.monotonic()
+
+    def record_written(self, state):
+        self.pending += 1
+        if self.pending >= self.every_records or time.monotonic() - self.written_at >= self.every_seconds:
+            self.flush(state)
+
+    def flush(self, state):
+        self.writer.write_state(state)
+        self.pending = 0
+        self.written_at = time.monotonic()
+
+    def flush_pending(self, state):
+        if self.pending:
+            self.flush(state)
+
+
+class DatetimeTransformer(Transformer):
+    """
+    `singer.Transformer` with `date-time` strings formatted by
+    `tap_toggl.dates.format_datetime`, which reads ISO-8601 with
+    `fromisoformat` and memoizes repeated values, instead of a dateutil
+    parse per value. The output string is the same.
+    """
+
+    def _transform_datetime(self, value):
+        if not isinstance(value, str) or not value or self.integer_datetime_fmt != NO_INTEGER_DATETIME_PARSING:
+            return super()._transform_datetime(value)
+        try:
+            return format_datetime(value)
+        except Exception: # pylint: disable=broad-except
+            # Let singer-python log the value and fail the record as it would.
+            return super()._transform_datetime(value)
+
+
+def sync_stream(state, instance, checkpointer=None, writer=None):
     stream = instance.stream
 
-    with metrics.record_counter(stream.tap_stream_id) as counter:
-        for (stream, record) in instance.sync(state):
-            counter.increment()
-            with Transformer() as transformer:
-                record = transformer.transform(record, stream.schema.to_dict(), metadata.to_map(stream.metadata))
-            singer.write_record(stream.tap_stream_id, record)
-            if instance.replication_method == "INCREMENTAL":
-                singer.write_state(state)
+    # Built once per stream rather than once per record.
+    schema = stream.schema.to_dict()
+    mdata = metadata.to_map(stream.metadata)
+    transform_seconds = 0.0
+    writer = writer or SingerWriter()
+    checkpointer = checkpointer or Checkpointer(writer=writer)
+
+    with metrics.record_counter(stream.tap_stream_id) as counter, DatetimeTransformer() as transformer:
+        try:
+            for (stream, record) in instance.sync(state):
+                counter.increment()
+                started = time.perf_counter()
+                record = transformer.transform(record, schema, mdata)
+                transform_seconds += time.perf_counter() - started
+                writer.write_record(stream.tap_stream_id, record)
+                if instance.replication_method == "INCREMENTAL":
+                    checkpointer.record_written(state)
+        except Exception:
+            checkpointer.flush_pending(state)
+            raise
 
+        log_transform_throughput(stream.tap_stream_id, counter.value, transform_seconds)
         return counter.value
+
+
+def log_transform_throughput(stream_name, count, seconds):
+    rate = count / seconds if seconds else 0
+    logger.info("%s: Transformed %s records in %.3fs (%.0f records/sec)", stream_name, count, seconds, rate)
+
+
+class _ChannelClosed(Exception):
+    """ Raised in stream threads once the output loop has stopped. """
+
+
+class ChannelWriter():
+    """
+    Writer handed to one stream running on its own thread. Messages are
+    queued for the single output writer in the order the stream produced
+    them; STATE carries a copy of this stream's bookmark only.
+    """
+
+    def __init__(self, stream_name, put):
+        self.stream_name = stream_name
+        self.put = put
+
+    def write_schema(self, stream_name, schema, key_properties):
+        self.put(('schema', stream_name, (stream_name, schema, key_properties)))
+
+    def write_record(self, stream_name, record):
+        self.put(('record', stream_name, (stream_name, record)))
+
+    def write_state(self, state):
+        bookmark = state.get('bookmarks', {}).get(self.stream_name)
+        self.put(('state', self.stream_name, copy.deepcopy(bookmark)))
+
+    def flush(self):
+        pass
+
+
+def sync_concurrently(state, tasks, writer, max_workers=DEFAULT_STREAM_WORKERS):
+    """
+    Run independent streams on up to `max_workers` threads with every
+    message written by `writer` on the calling thread.
+
+    `tasks` are (stream_name, run) pairs; `run(state, writer)` syncs one
+    stream against a private copy of the state. Each stream's messages keep
+    their order, so its SCHEMA precedes its RECORDs, and a STATE message
+    merges that stream's bookmark into `state` only after the records
+    before it were written, so written state never runs ahead of the output.
+    """
+    channel = queue.Queue(maxsize=CHANNEL_SIZE)
+    stop = threading.Event()
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                channel.put(message, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _ChannelClosed()
+
+    def run(stream_name, task):
+        stream_state = copy.deepcopy({key: value for key, value in state.items() if key != 'bookmarks'})
+        bookmark = state.get('bookmarks', {}).get(stream_name)
+        stream_state['bookmarks'] = {stream_name: copy.deepcopy(bookmark)} if bookmark is not None else {}
+        try:
+            task(stream_state, ChannelWriter(stream_name, put))
+            put(('done', stream_name, None))
+        except _ChannelClosed:
+            pass
+        except Exception as error: # pylint: disable=broad-except
+            try:
+                put(('error', stream_name, error))
+            except _ChannelClosed:
+                pass
+
+    with ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix='tap-toggl-stream') as executor:
+        futures = [executor.submit(run, stream_name, task) for stream_name, task in tasks]
+        remaining = len(futures)
+        try:
+            while remaining:
+                kind, stream_name, payload = channel.get()
+                if kind == 'schema':
+                    writer.write_schema(*payload)
+                elif kind == 'record':
+                    writer.write_record(*payload)
+                elif kind == 'state':
+                    if payload is not None:
+                        state.setdefault('bookmarks', {})[stream_name] = payload
+                    writer.write_state(state)
+                elif kind == 'done':
+                    remaining -= 1
+                else:
+                    logger.error("%s: Sync failed, stopping the other streams", stream_name)
+                    raise payload
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
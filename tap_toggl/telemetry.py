@@ -0,0 +1,121 @@
+#
+# Module dependencies.
+#
+
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+import singer
+from singer.metrics import Metric, Point, Status, Tag, log
+
+logger = singer.get_logger()
+
+WORKSPACE_PATH = re.compile(r'/workspaces?/(\d+)')
+# Families that are not named after the stream they feed.
+FAMILY_STREAMS = {
+  'reports_v2_details': 'time_entries',
+  'reports_v3_search': 'time_entries',
+  'me': None
+}
+
+
+def endpoint_family(url):
+  """ Collapse a request URL to its endpoint family, e.g. `.../workspaces/42/clients?page=2` -> `clients`. """
+  path = urlparse(url).path
+  if '/reports/api/v2/details' in path:
+    return 'reports_v2_details'
+  if '/reports/api/v3/' in path:
+    return 'reports_v3_search'
+  segments = [segment for segment in path.split('/') if segment and not segment.isdigit()]
+  return segments[-1] if segments else ''
+
+
+def workspace_of(url):
+  parsed = urlparse(url)
+  match = WORKSPACE_PATH.search(parsed.path)
+  if match:
+    return int(match.group(1))
+  values = parse_qs(parsed.query).get('workspace_id')
+  return int(values[0]) if values else None
+
+
+def stream_of(family):
+  return FAMILY_STREAMS.get(family, family)
+
+
+class HttpTelemetry():
+  """
+  HTTP metrics per endpoint family, emitted as Singer metric log lines.
+
+  With `per_request`, every response is logged as an `http_request_duration`
+  timer tagged with its endpoint family, workspace and status code. Totals
+  (requests, time, bytes, status codes, retries and backoff sleep) are kept
+  per family and logged per stream by `log_summary()` at the end of the run.
+  """
+
+  def __init__(self, per_request=True):
+    self.per_request = per_request
+    self.families = {}
+    self._lock = threading.Lock()
+
+
+  def _totals(self, family):
+    totals = self.families.get(family)
+    if totals is None:
+      totals = self.families[family] = {'requests': 0, 'seconds': 0.0, 'bytes': 0, 'retries': 0,
+                                        'backoff_seconds': 0.0, 'status_codes': Counter()}
+    return totals
+
+
+  def request(self, url, status_code, elapsed):
+    family = endpoint_family(url)
+    with self._lock:
+      totals = self._totals(family)
+      totals['requests'] += 1
+      totals['seconds'] += elapsed
+      totals['status_codes'][status_code or 'error'] += 1
+    if not self.per_request:
+      return
+    tags = {Tag.endpoint: family,
+            Tag.http_status_code: status_code,
+            Tag.status: Status.succeeded if status_code is not None and status_code < 400 else Status.failed}
+    workspace_id = workspace_of(url)
+    if workspace_id is not None:
+      tags['workspace_id'] = workspace_id
+    log(logger, Point('timer', Metric.http_request_duration, elapsed, tags))
+
+
+  def received(self, url, size):
+    with self._lock:
+      self._totals(endpoint_family(url))['bytes'] += size
+
+
+  def retry(self, url, wait=0.0):
+    with self._lock:
+      totals = self._totals(endpoint_family(url))
+      totals['retries'] += 1
+      totals['backoff_seconds'] += wait or 0.0
+
+
+  def report_window(self, family, window, pages):
+    """ Log the number of pages fetched for one finished report window in this run. """
+    workspace_id, since, until = window
+    log(logger, Point('counter', 'report_window_pages', pages,
+                      {Tag.endpoint: family, 'workspace_id': workspace_id, 'since': since, 'until': until}))
+
+
+  def log_summary(self):
+    with self._lock:
+      families = {family: dict(totals, status_codes=dict(totals['status_codes']))
+                  for family, totals in self.families.items()}
+    for family, totals in sorted(families.items()):
+      tags = {Tag.endpoint: family, 'stream': stream_of(family)}
+      for metric, value in (('http_request_count', totals['requests']),
+                            ('http_bytes_received', totals['bytes']),
+                            ('http_retries', totals['retries']),
+                            ('http_backoff_seconds', round(totals['backoff_seconds'], 3))):
+        log(logger, Point('counter', metric, value, tags))
+      log(logger, Point('timer', 'http_request_duration_total', round(totals['seconds'], 3), tags))
+      for status_code, count in sorted(totals['status_codes'].items(), key=str):
+        log(logger, Point('counter', 'http_status_count', count, dict(tags, http_status_code=status_code)))
@@ -3,35 +3,305 @@
 # Module dependencies.
 #
 
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from singer import utils
 import backoff
+import itertools
+import json
 import requests
 import logging
+import queue
 import sys
+import threading
+import time
+from tap_toggl.cache import ResponseCache, DEFAULT_CACHE_SIZE
+from tap_toggl.dates import parse_datetime, utc_midnight
+from tap_toggl.governor import RequestGovernor
+from tap_toggl.http_cache import HttpCache, DEFAULT_HTTP_CACHE_MAX_BYTES
+from tap_toggl.jsonstream import iter_items
+from tap_toggl.telemetry import HttpTelemetry, endpoint_family
+from tap_toggl.windows import WindowPlanner, ReportProgress, DEFAULT_TARGET_PAGES
 from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
 
 BASE_URL = "https://api.track.toggl.com/api"
 API_VERSION = "v9"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_REQUEST_TIMEOUT = 300
+DEFAULT_MAX_WORKERS = 1
+FAN_OUT_ORDERS = ('ordered', 'as_completed')
+REPORTS_V2_DETAILS_URL = 'https://api.track.toggl.com/reports/api/v2/details?workspace_id={workspace_id}&since={start_date}&until={end_date}&user_agent={user_agent}'
+REPORTS_V3_SEARCH_URL = 'https://api.track.toggl.com/reports/api/v3/workspace/{workspace_id}/search/time_entries'
+REPORTS_APIS = ('v2', 'v3')
+DEFAULT_REPORTS_PAGE_SIZE = 1000
+REPORTS_V2_PAGE_SIZE = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+# Items per batch handed from a fan-out worker to the consumer, and batches
+# each in-flight job may buffer before its worker waits.
+FAN_OUT_BATCH_SIZE = 500
+FAN_OUT_QUEUE_BATCHES = 4
+# 429 responses retried by the governor before backoff takes over.
+MAX_THROTTLED_RETRIES = 10
+# Times a streamed body is reopened after the connection breaks mid-read.
+MAX_STREAM_RETRIES = 5
+STREAM_READ_ERRORS = (requests.exceptions.ChunkedEncodingError,
+                      requests.exceptions.ConnectionError)
+# Dimension endpoints revalidated against the on-disk HTTP cache. Projects,
+# tasks and reports carry a `since` or date range that changes every run.
+CONDITIONAL_FAMILIES = ('workspaces', 'clients', 'groups', 'tags', 'users', 'workspace_users')
 
 logger = logging.getLogger()
 
 
+def map_report_v3_entry(workspace_id, row, entry):
+  """ Map a Reports v3 detailed-search row and one of its time entries onto `time_entries.json`. """
+  return {
+    'id': entry.get('id'),
+    'wid': workspace_id,
+    'workspace_id': workspace_id,
+    'pid': row.get('project_id'),
+    'project_id': row.get('project_id'),
+    'tid': row.get('task_id'),
+    'task_id': row.get('task_id'),
+    'uid': row.get('user_id'),
+    'user_id': row.get('user_id'),
+    'user_name': row.get('username'),
+    'description': row.get('description'),
+    'billable': row.get('billable'),
+    'tag_ids': row.get('tag_ids'),
+    'start': entry.get('start'),
+    'stop': entry.get('stop'),
+    'duration': entry.get('seconds'),
+    'at': entry.get('at'),
+    # v2 reports call the modification time `updated`, the stream's replication key.
+    'updated': entry.get('at')
+  }
+
+
+_JOB_DONE = object()
+
+
+class _FanOutStopped(Exception):
+  """ Raised in fan-out workers once the consumer has gone away. """
+
+
+def _unique(values):
+  return list(OrderedDict.fromkeys(values))
+
+
+def _record_backoff(details):
+  # backoff handler: args are (client, url, ...).
+  client, url = details['args'][:2]
+  client.telemetry.retry(url, details.get('wait'))
+
+
+class PageEnd(object):
+  """
+  Marker following the items of each page of a report window when progress
+  is tracked. `job` is the window or endpoint being fetched, `cursor` where
+  its next page starts (None once the job is finished) and `rows` the number
+  of rows on the page. Markers never leave the client.
+  """
+  __slots__ = ('job', 'cursor', 'rows')
+
+  def __init__(self, job, cursor, rows):
+    self.job = job
+    self.cursor = cursor
+    self.rows = rows
+
+
+class PageSpec(object):
+  """
+  How a paged endpoint is read: pages are numbered from `first_page` and
+  hold at most `page_size` rows, requested with `size_param` unless the
+  endpoint's page size is fixed. Rows sit under `key` in the body, or the
+  body is the list itself. A page with fewer than `page_size` rows is the
+  last, so no request is spent on an empty page after it.
+  """
+  __slots__ = ('page_size', 'first_page', 'size_param', 'key')
+
+  def __init__(self, page_size, first_page=1, size_param='per_page', key=None):
+    self.page_size = page_size
+    self.first_page = first_page
+    self.size_param = size_param
+    self.key = key
+
+  def is_last(self, rows):
+    return rows < self.page_size
+
+
+# Paged v9 endpoints serve up to 200 rows a page; Reports v2 pages hold a
+# fixed 50. Reports v3 is paged by the row cursor in `_report_v3_rows`.
+PROJECTS_PAGING = PageSpec(200)
+TASKS_PAGING = PageSpec(200, key='data')
+REPORTS_V2_PAGING = PageSpec(REPORTS_V2_PAGE_SIZE, size_param=None, key='data')
+
+
+class Topology(object):
+  """ Workspaces visible to the token and their organizations, deduplicated and shared by every stream. """
+
+  def __init__(self, workspaces):
+    self.workspaces = workspaces
+    self.workspace_ids = _unique(item['id'] for item in workspaces)
+    self.organization_ids = _unique(item['organization_id'] for item in workspaces)
+    # Organizations shared by several workspaces would otherwise be fetched once per workspace.
+    self.duplicate_organizations = len(workspaces) - len(self.organization_ids)
+
+
+def _page_of(url):
+  pages = parse_qs(urlparse(url).query).get('page')
+  return int(pages[0]) if pages else None
+
+
+def _as_bool(value):
+  if isinstance(value, str):
+    return value.strip().lower() not in ('false', '0', 'no', 'off', '')
+  return bool(value)
+
+
 """ Simple wrapper for Toggl. """
 class Toggl(object):
 
-  def __init__(self, api_token=None, start_date=None, user_agent=None, trailing_days=1):
+  def __init__(self, api_token=None, start_date=None, user_agent=None, trailing_days=1,
+               pool_size=DEFAULT_POOL_SIZE, request_timeout=DEFAULT_REQUEST_TIMEOUT, keep_alive=True,
+               max_workers=DEFAULT_MAX_WORKERS, fan_out_order='ordered', report_workers=None,
+               max_concurrent_requests=None, max_requests_per_second=None, request_burst=None,
+               latency_target=None, server_side_filters=True, reports_api='v2',
+               reports_page_size=DEFAULT_REPORTS_PAGE_SIZE, report_target_pages=DEFAULT_TARGET_PAGES,
+               stream_json=False, request_cache_size=DEFAULT_CACHE_SIZE, http_metrics=True,
+               http_cache_dir=None, http_cache_max_bytes=DEFAULT_HTTP_CACHE_MAX_BYTES, http_cache_bypass=False):
     self.api_token = api_token
     self.trailing_days = int(trailing_days)
     self.start_date = start_date
-    self.workspace_ids = []
-    self.organization_ids = []
+    self._topology = None
+    self._workspace_ids = None
+    self._organization_ids = None
     self.user_agent = user_agent
-    res = self._get(f'{BASE_URL}/{API_VERSION}/workspaces')
-    for item in res:
-      self.workspace_ids.append(item['id'])
-      self.organization_ids.append(item['organization_id'])
+    self.pool_size = int(pool_size)
+    self.request_timeout = float(request_timeout)
+    self.keep_alive = _as_bool(keep_alive)
+    self.max_workers = max(int(max_workers), 1)
+    if fan_out_order not in FAN_OUT_ORDERS:
+      raise ValueError('fan_out_order must be one of {}'.format(', '.join(FAN_OUT_ORDERS)))
+    self.fan_out_order = fan_out_order
+    self.report_workers = max(int(report_workers or self.max_workers), 1)
+    # Global cap on in-flight requests, shared by every stream and window.
+    self.max_concurrent_requests = max(int(max_concurrent_requests or self.pool_size), 1)
+    self.governor = RequestGovernor(self.max_concurrent_requests,
+                                    rate=max_requests_per_second,
+                                    burst=request_burst,
+                                    latency_target=latency_target)
+    self.server_side_filters = _as_bool(server_side_filters)
+    if reports_api not in REPORTS_APIS:
+      raise ValueError('reports_api must be one of {}'.format(', '.join(REPORTS_APIS)))
+    self.reports_api = reports_api
+    self.reports_page_size = int(reports_page_size)
+    self.report_target_pages = report_target_pages
+    self.stream_json = _as_bool(stream_json)
+    # Learned rows per day per workspace; `TimeEntries.sync` swaps in the dict kept in state.
+    self.window_density = {}
+    # Resumable report progress; `TimeEntries.sync` swaps in the dict kept in state.
+    self.report_progress = {}
+    self.session = self._build_session()
+    self.cache = ResponseCache(request_cache_size)
+    self.telemetry = HttpTelemetry(per_request=_as_bool(http_metrics))
+    # Keyed by token as well as URL: the same URL lists different rows for different accounts.
+    self.http_cache = None
+    if http_cache_dir:
+      self.http_cache = HttpCache(http_cache_dir, namespace=api_token, max_bytes=http_cache_max_bytes,
+                                  bypass=_as_bool(http_cache_bypass))
+
+  # The topology is fetched on first use, so constructing a client makes no requests.
+  @property
+  def topology(self):
+    if self._topology is None:
+      self._topology = Topology(self._get_cached(f'{BASE_URL}/{API_VERSION}/workspaces'))
+    return self._topology
+
+
+  @property
+  def workspace_ids(self):
+    if self._workspace_ids is None:
+      self._workspace_ids = self.topology.workspace_ids
+    return self._workspace_ids
+
+
+  @workspace_ids.setter
+  def workspace_ids(self, workspace_ids):
+    self._workspace_ids = workspace_ids
+
+
+  @property
+  def organization_ids(self):
+    if self._organization_ids is None:
+      self._organization_ids = self.topology.organization_ids
+    return self._organization_ids
+
+
+  @organization_ids.setter
+  def organization_ids(self, organization_ids):
+    self._organization_ids = organization_ids
+
+
+  def _build_session(self):
+    # One long-lived session so every page and workspace endpoint reuses
+    # pooled TCP/TLS connections instead of paying a new handshake.
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(self.api_token, 'api_token')
+    pool_maxsize = max(self.pool_size, self.max_workers, self.report_workers)
+    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not self.keep_alive:
+      session.headers['Connection'] = 'close'
+    return session
+
+
+  def connection_stats(self):
+    requests_made = 0
+    connections_opened = 0
+    for adapter in set(self.session.adapters.values()):
+      pools = adapter.poolmanager.pools
+      for key in pools.keys():
+        pool = pools[key]
+        requests_made += pool.num_requests
+        connections_opened += pool.num_connections
+    return {
+      'requests': requests_made,
+      'connections_opened': connections_opened,
+      'reused': max(requests_made - connections_opened, 0)
+    }
+
+
+  def log_stats(self):
+    self.log_connection_stats()
+    self.log_cache_stats()
+    self.governor.log_stats()
+    self.telemetry.log_summary()
+
+
+  def log_cache_stats(self):
+    logger.info('Request cache: {hits} calls served from cache, {duplicates} duplicate organization '
+                'calls skipped, {misses} cacheable calls made.'.format(
+                  hits=self.cache.hits, misses=self.cache.misses,
+                  duplicates=self._topology.duplicate_organizations if self._topology else 0))
+    if self.http_cache is not None:
+      logger.info('HTTP cache: {not_modified} responses not modified, {stored} stored, {evicted} evicted.'.format(
+        not_modified=self.http_cache.not_modified, stored=self.http_cache.stored, evicted=self.http_cache.evicted))
+
+
+  def log_connection_stats(self):
+    stats = self.connection_stats()
+    logger.info('HTTP connections: {requests} requests, {connections_opened} connections opened, '
+                '{reused} requests reused a pooled connection.'.format(**stats))
+
+
+  def close(self):
+    self.log_stats()
+    self.session.close()
+
 
   # pylint: disable=E0213
   def request_too_large(error):
@@ -54,69 +324,298 @@ class Toggl(object):
       endpoints.append(endpoint.format(organization_id=organization_id))
     return endpoints
 
-  def _paginate_endpoint(self, endpoint, page=0):
+  def _get_cached(self, url):
+    return self.cache.get(url, self._get)
+
+
+  def _with_query(self, endpoint, **params):
     parsed_url = urlparse(endpoint)
     query_params = parse_qs(parsed_url.query)
 
-    query_params['page'] = [str(page)]
+    for name, value in params.items():
+      query_params[name] = [str(value)]
 
-    updated_query = urlencode(query_params, doseq=True)
+    updated_query = urlencode(query_params, doseq=True, safe='{}')
     updated_url = urlunparse(parsed_url._replace(query=updated_query))
 
     return updated_url
 
+  def _paginate_endpoint(self, endpoint, page=1, paging=None):
+    if paging is not None and paging.size_param:
+      return self._with_query(endpoint, page=page, **{paging.size_param: paging.page_size})
+    return self._with_query(endpoint, page=page)
+
+  def _since(self, endpoint, bookmark):
+    # Ask the API for rows modified since the bookmark. `Stream.sync` still
+    # filters with `is_bookmark_old`, so this only trims the transfer.
+    if not bookmark or not self.server_side_filters:
+      return endpoint
+    try:
+      since = int(parse_datetime(bookmark).timestamp())
+    except (OverflowError, ValueError, TypeError):
+      return endpoint
+    return self._with_query(endpoint, since=since)
+
 
   @backoff.on_exception(backoff.expo,
                         requests.exceptions.RequestException,
-                        giveup=request_too_large)
+                        giveup=request_too_large,
+                        on_backoff=_record_backoff)
   def _get(self, url, **kwargs):
     logger.info("Hitting {url}".format(url=url))
-    response = requests.get(url, auth=HTTPBasicAuth(self.api_token, 'api_token'))
+    if not self._http_cacheable(url):
+      response = self._governed_request('GET', url)
+      response.raise_for_status()
+      return response.json()
+    entry = self.http_cache.lookup(url)
+    response = self._governed_request('GET', url, headers=self.http_cache.conditional_headers(entry))
+    return self._revalidated(url, entry, response)
+
+
+  def _http_cacheable(self, url):
+    return self.http_cache is not None and endpoint_family(url) in CONDITIONAL_FAMILIES
+
+
+  def _revalidated(self, url, entry, response):
+    # A 304 confirms the stored body is current; any other success replaces it.
+    if entry is not None and response.status_code == 304:
+      self.http_cache.hit(url)
+      return json.loads(entry[1])
     response.raise_for_status()
+    self.http_cache.store(url, response.headers, response.content)
     return response.json()
 
 
-  def _get_response(self, url, column_name=None, bookmark=None, key=None):
-    # Special paginated case for `time_entries`, which requires `key` attribute.
-    if key == "data":
-      page = 1 if "/tasks" in url else 0
-      length = 1
-      while length > 0:
-        url = self._paginate_endpoint(url, page)
-        res = self._get(url)
-        data = res["data"]
-        if data:
-          length = len(data)
-          logger.info('Endpoint returned {length} rows.'.format(length=length))
-          for item in data:
+  @backoff.on_exception(backoff.expo,
+                        requests.exceptions.RequestException,
+                        giveup=request_too_large,
+                        on_backoff=_record_backoff)
+  def _post(self, url, body):
+    logger.info("Hitting {url} with {body}".format(url=url, body=body))
+    response = self._governed_request('POST', url, json=body)
+    response.raise_for_status()
+    return response
+
+
+  def _governed_request(self, method, url, **kwargs):
+    # Every request passes through the governor. A 429 pauses all workers
+    # for its Retry-After, then the request is retried here instead of
+    # sleeping on the exponential backoff schedule.
+    throttled_retries = 0
+    while True:
+      self.governor.acquire()
+      status_code, headers = None, None
+      start = time.monotonic()
+      try:
+        response = self.session.request(method, url, timeout=self.request_timeout, **kwargs)
+        status_code, headers = response.status_code, response.headers
+      finally:
+        elapsed = time.monotonic() - start
+        self.governor.release(status_code, headers, elapsed)
+        self.telemetry.request(url, status_code, elapsed)
+      if not kwargs.get('stream'):
+        self.telemetry.received(url, len(response.content or b''))
+      if response.status_code != 429 or throttled_retries >= MAX_THROTTLED_RETRIES:
+        return response
+      response.close()
+      throttled_retries += 1
+      self.telemetry.retry(url, max(self.governor.paused_until - time.monotonic(), 0.0))
+      logger.warning('Throttled on {url}, retrying ({retries}/{max_retries}).'.format(
+        url=url, retries=throttled_retries, max_retries=MAX_THROTTLED_RETRIES))
+
+
+  @backoff.on_exception(backoff.expo,
+                        requests.exceptions.RequestException,
+                        giveup=request_too_large,
+                        on_backoff=_record_backoff)
+  def _open_stream(self, url):
+    logger.info("Hitting {url}".format(url=url))
+    response = self._governed_request('GET', url, stream=True)
+    response.raise_for_status()
+    return response
+
+
+  def _counted_chunks(self, url, response):
+    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+      self.telemetry.received(url, len(chunk))
+      yield chunk
+
+
+  def _get_streamed(self, url, key=None):
+    # Items are decoded while the body is still arriving, so memory stays
+    # bounded by one item rather than by the size of the response. A
+    # connection that breaks mid-body is reopened and the items already
+    # yielded are skipped, which relies on the endpoint's stable ordering.
+    yielded = 0
+    delays = backoff.expo()
+    next(delays)
+    for attempt in range(MAX_STREAM_RETRIES + 1):
+      response = self._open_stream(url)
+      skip = yielded
+      try:
+        with response:
+          for item in iter_items(self._counted_chunks(url, response), key):
+            if skip:
+              skip -= 1
+              continue
+            yielded += 1
             yield item
-          page += 1
-        else:
-          length = 0
+        return
+      except STREAM_READ_ERRORS as error:
+        if attempt == MAX_STREAM_RETRIES:
+          raise
+        delay = next(delays)
+        self.telemetry.retry(url, delay)
+        logger.warning('Stream of {url} broke after {yielded} items ({error}); retrying in {delay}s.'.format(
+          url=url, yielded=yielded, error=error, delay=delay))
+        time.sleep(delay)
+
+
+  def _get_items(self, url, key=None):
+    # Revalidated responses are small and replayed whole from disk, so they are not streamed.
+    if self.stream_json and not self._http_cacheable(url):
+      return self._get_streamed(url, key)
+    res = self._get(url)
+    res = [] if res is None else res
+    return res[key] if key is not None else res
+
+
+  def _get_response(self, url, column_name=None, bookmark=None, key=None, markers=False, paging=None):
+    # Paged endpoints are read page by page as `paging` describes. A `page`
+    # already in the URL is where a resumed window starts; with `markers`, a
+    # `PageEnd` follows every page.
+    if paging is not None:
+      job = url
+      page = _page_of(url)
+      if page is None:
+        page = paging.first_page
+      while True:
+        length = 0
+        for item in self._get_items(self._paginate_endpoint(url, page, paging), paging.key):
+          length += 1
+          yield item
+        logger.info('Endpoint returned {length} rows.'.format(length=length))
+        page += 1
+        last = paging.is_last(length)
+        if markers:
+          yield PageEnd(job, None if last else page, length)
+        if last:
+          break
 
     else:
-      res = self._get(url)
-      res = [] if res is None else res
-      data = res[key] if key is not None else res
-      length = len(data)
-      logger.info('Endpoint returned {length} rows.'.format(length=length))
-      for item in data:
+      length = 0
+      for item in self._get_items(url, key):
+        length += 1
         yield item
+      logger.info('Endpoint returned {length} rows.'.format(length=length))
 
 
-  def _get_from_endpoints(self, endpoints, column_name=None, bookmark=None, key=None):
-    for endpoint in endpoints:
-      gtr = self._get_response(endpoint, key=key)
-      for item in gtr:
+  def _fan_out(self, fetch, jobs, max_workers=None):
+    """
+    Run up to `max_workers` jobs at once and yield `(job, items)` batches as
+    they arrive, then `(job, None)` once a job is finished. Batches travel
+    through bounded queues: at most two jobs per worker are in flight and
+    each buffers a few batches, however large its response.
+    """
+    max_workers = max_workers or self.max_workers
+    max_in_flight = max_workers * 2
+    ordered = self.fan_out_order == 'ordered'
+    stop = threading.Event()
+    shared = queue.Queue(maxsize=max_in_flight * FAN_OUT_QUEUE_BATCHES)
+
+    def put(channel, event):
+      while not stop.is_set():
+        try:
+          channel.put(event, timeout=0.1)
+          return
+        except queue.Full:
+          continue
+      raise _FanOutStopped()
+
+    def run(index, job, channel):
+      try:
+        if stop.is_set():
+          return
+        batch = []
+        for item in fetch(job):
+          batch.append(item)
+          if len(batch) >= FAN_OUT_BATCH_SIZE:
+            put(channel, (index, batch))
+            batch = []
+        if batch:
+          put(channel, (index, batch))
+        put(channel, (index, _JOB_DONE))
+      except _FanOutStopped:
+        pass
+      except Exception as error: # pylint: disable=broad-except
+        try:
+          put(channel, (index, error))
+        except _FanOutStopped:
+          pass
+
+    jobs = enumerate(jobs)
+    in_flight = OrderedDict()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      try:
+        while True:
+          while len(in_flight) < max_in_flight:
+            index, job = next(jobs, (None, None))
+            if index is None:
+              break
+            channel = queue.Queue(maxsize=FAN_OUT_QUEUE_BATCHES) if ordered else shared
+            in_flight[index] = (job, channel)
+            futures.append(executor.submit(run, index, job, channel))
+          if not in_flight:
+            return
+          # Ordered output drains the oldest job first; later jobs keep
+          # fetching until their own queues are full.
+          channel = in_flight[next(iter(in_flight))][1] if ordered else shared
+          index, batch = channel.get()
+          if isinstance(batch, Exception):
+            raise batch
+          job = in_flight[index][0]
+          if batch is _JOB_DONE:
+            del in_flight[index]
+            yield job, None
+          else:
+            yield job, batch
+      finally:
+        stop.set()
+        for future in futures:
+          future.cancel()
+
+
+  def _fetch_all(self, fetch, jobs, max_workers=None):
+    """
+    Yield the items `fetch` returns for every job, up to `max_workers` jobs
+    at once. `jobs` may be a lazy iterable.
+    """
+    max_workers = max_workers or self.max_workers
+    if max_workers == 1:
+      for job in jobs:
+        for item in fetch(job):
+          yield item
+      return
+
+    for _, items in self._fan_out(fetch, jobs, max_workers=max_workers):
+      if items is None:
+        continue
+      for item in items:
         yield item
 
 
+  def _get_from_endpoints(self, endpoints, column_name=None, bookmark=None, key=None, max_workers=None, markers=False, paging=None):
+    return self._fetch_all(lambda endpoint: self._get_response(endpoint, key=key, markers=markers, paging=paging),
+                           endpoints, max_workers)
+
+
   def is_authorized(self):
-    return self._get(f'{BASE_URL}/{API_VERSION}' + '/me')
+    return self._get_cached(f'{BASE_URL}/{API_VERSION}' + '/me')
 
 
   def workspaces(self, column_name=None, bookmark=None):
-    res = self._get(f'{BASE_URL}/{API_VERSION}' + '/workspaces')
+    res = self._get_cached(f'{BASE_URL}/{API_VERSION}' + '/workspaces')
     for item in res:
       yield item
 
@@ -131,14 +630,16 @@ class Toggl(object):
     return self._get_from_endpoints(endpoints, column_name, bookmark)
 
 
-  def projects(self, column_name=None, bookmark=None): 
-    endpoints = self._get_workspace_endpoints(f'{BASE_URL}/{API_VERSION}' + r'/workspaces/{workspace_id}/projects')
-    return self._get_from_endpoints(endpoints, column_name, bookmark)
+  # Of the workspace endpoints, only projects and tasks accept `since` in v9;
+  # clients, tags, groups and workspace_users are filtered client side.
+  def projects(self, column_name=None, bookmark=None):
+    endpoints = self._get_workspace_endpoints(self._since(f'{BASE_URL}/{API_VERSION}' + r'/workspaces/{workspace_id}/projects', bookmark))
+    return self._get_from_endpoints(endpoints, column_name, bookmark, paging=PROJECTS_PAGING)
 
 
   def tasks(self, column_name=None, bookmark=None):
-    endpoints = self._get_workspace_endpoints(f'{BASE_URL}/{API_VERSION}' + r'/workspaces/{workspace_id}/tasks')
-    return self._get_from_endpoints(endpoints, column_name, bookmark, key='data')
+    endpoints = self._get_workspace_endpoints(self._since(f'{BASE_URL}/{API_VERSION}' + r'/workspaces/{workspace_id}/tasks', bookmark))
+    return self._get_from_endpoints(endpoints, column_name, bookmark, paging=TASKS_PAGING)
 
 
   def tags(self, column_name=None, bookmark=None):
@@ -156,28 +657,116 @@ class Toggl(object):
     return self._get_from_endpoints(endpoints, column_name, bookmark)
 
 
-  def time_entries(self, column_name=None, bookmark=None):
-    fmt = '%Y-%m-%d'
-    end_date = datetime.today().strftime(fmt)
-    
+  def _report_range(self, bookmark):
+    # Both ends are whole days at midnight UTC; the start keeps the calendar
+    # date of the bookmark (or start date) in its own offset.
+    end_date = utc_midnight(datetime.today())
+
     try:
-      start_date = (utils.strptime_with_tz(bookmark) - timedelta(days=self.trailing_days)).strftime(fmt)
- 
+      start_date = utc_midnight(parse_datetime(bookmark) - timedelta(days=self.trailing_days))
+
     except (AttributeError, OverflowError, ValueError, TypeError):
       if bookmark is None:
-        start_date = utils.strptime_with_tz(self.start_date).strftime(fmt)
-
-    endpoints = []
-    moving_start_date = utils.strptime_with_tz(start_date)
-    moving_end_date = moving_start_date + timedelta(days=30)
-    while moving_start_date <= utils.strptime_with_tz(end_date):
-      new_endpoints = self._get_workspace_endpoints('https://api.track.toggl.com/reports/api/v2/details?workspace_id={{workspace_id}}&since={start_date}&until={end_date}&user_agent={user_agent}'.format(start_date=moving_start_date.strftime(fmt), end_date=moving_end_date.strftime(fmt), user_agent=self.user_agent))
-      endpoints.extend(new_endpoints)
-      moving_start_date += timedelta(days=30)
-      moving_end_date = moving_start_date + timedelta(days=30)
-
-    return self._get_from_endpoints(endpoints, column_name, bookmark, "data")    
-
-
+        start_date = utc_midnight(parse_datetime(self.start_date))
+
+    return start_date, end_date
+
+
+  def _report_windows(self, planner, progress, start_date, end_date):
+    """ Windows left unfinished by an earlier run, then lazily planned windows for the rest of the range. """
+    resumed = [window for window, _ in progress.pending()]
+    covered = {workspace_id: progress.covered(workspace_id) for workspace_id in self.workspace_ids}
+    return itertools.chain(resumed, planner.plan(self.workspace_ids, start_date, end_date, covered=covered))
+
+
+  def _report_v3_rows(self, window, cursor=None):
+    # Yields a `PageEnd` after every page; `cursor` resumes a window mid-way.
+    workspace_id, since, until = window
+    url = REPORTS_V3_SEARCH_URL.format(workspace_id=workspace_id)
+    body = {'start_date': since, 'end_date': until, 'page_size': self.reports_page_size,
+            'order_by': 'date', 'order_dir': 'ASC'}
+    body.update(cursor or {})
+    while True:
+      response = self._post(url, body)
+      rows = response.json() or []
+      logger.info('Endpoint returned {length} rows.'.format(length=len(rows)))
+      length = 0
+      for row in rows:
+        for entry in row.get('time_entries') or []:
+          length += 1
+          yield map_report_v3_entry(workspace_id, row, entry)
+      next_id = response.headers.get('X-Next-ID')
+      next_row_number = response.headers.get('X-Next-Row-Number')
+      if not rows or not next_row_number:
+        yield PageEnd(window, None, length)
+        break
+      body['first_row_number'] = int(next_row_number)
+      if next_id:
+        body['first_id'] = int(next_id)
+      yield PageEnd(window, {name: body[name] for name in ('first_row_number', 'first_id') if name in body}, length)
+
+
+  def _track_report_progress(self, entries, planner, progress, family, resumed, window_of):
+    # Runs on the consumer's thread: a `PageEnd` is only reached once every
+    # row before it was written, so progress never runs ahead of the output.
+    rows = Counter()
+    pages = Counter()
+    for item in entries:
+      if not isinstance(item, PageEnd):
+        yield item
+        continue
+      window = window_of(item)
+      rows[window] += item.rows
+      pages[window] += 1
+      if item.cursor is not None:
+        progress.page_done(window, item.cursor)
+        continue
+      progress.window_done(window)
+      window_rows = rows.pop(window)
+      self.telemetry.report_window(family, window, pages.pop(window))
+      # Resumed windows were only partly fetched, so they say little about density.
+      if window not in resumed:
+        planner.observe_window(window, window_rows)
+    planner.finish()
 
 
+  def time_entries(self, column_name=None, bookmark=None):
+    page_size = self.reports_page_size if self.reports_api == 'v3' else REPORTS_V2_PAGE_SIZE
+    planner = WindowPlanner(self.window_density, page_size, self.report_target_pages)
+    start_date, end_date = self._report_range(bookmark)
+    progress = ReportProgress(self.report_progress, start_date.strftime('%Y-%m-%d'))
+    resumed = dict(progress.pending())
+    windows = self._report_windows(planner, progress, start_date, end_date)
+
+    # Each (workspace, window) is paged sequentially by a single worker,
+    # while up to `report_workers` windows run at once. Windows are
+    # interleaved across workspaces so concurrent workers spread out, and
+    # planned only as workers free up so each is sized from the rows its
+    # workspace returned so far. The stream bookmark is the maximum
+    # `updated` seen, so it advances correctly regardless of the order
+    # windows complete in.
+    if self.reports_api == 'v3':
+      family = 'reports_v3_search'
+      entries = self._fetch_all(lambda window: self._report_v3_rows(window, resumed.get(window)), windows,
+                                max_workers=self.report_workers)
+      window_of = lambda page_end: page_end.job
+    else:
+      # v2 rows carry no workspace id, so pages are mapped back to their window by endpoint.
+      family = 'reports_v2_details'
+      planned = {}
+
+      def endpoints():
+        for window in windows:
+          workspace_id, since, until = window
+          endpoint = REPORTS_V2_DETAILS_URL.format(workspace_id=workspace_id, start_date=since, end_date=until, user_agent=self.user_agent)
+          if window in resumed:
+            endpoint = self._paginate_endpoint(endpoint, resumed[window])
+          planned[endpoint] = window
+          yield endpoint
+
+      def window_of(page_end):
+        return planned[page_end.job] if page_end.cursor is not None else planned.pop(page_end.job)
+
+      entries = self._get_from_endpoints(endpoints(), column_name, bookmark, max_workers=self.report_workers,
+                                         markers=True, paging=REPORTS_V2_PAGING)
+    return self._track_report_progress(entries, planner, progress, family, resumed, window_of)
@@ -0,0 +1,202 @@
+#
+# Module dependencies.
+#
+
+import math
+import threading
+from datetime import datetime, timedelta
+import singer
+
+logger = singer.get_logger()
+
+DEFAULT_WINDOW_DAYS = 30
+MIN_WINDOW_DAYS = 1
+# The reports APIs reject ranges longer than a year.
+MAX_WINDOW_DAYS = 365
+DEFAULT_TARGET_PAGES = 10
+# Weight of the newest observation when blending it into the stored density.
+DENSITY_SMOOTHING = 0.5
+
+
+def merge_ranges(ranges, fmt='%Y-%m-%d'):
+  """ Merge overlapping or adjacent (since, until) date ranges into sorted [since, until] lists. """
+  merged = []
+  for since, until in sorted(tuple(dates) for dates in ranges):
+    if merged and datetime.strptime(since, fmt) <= datetime.strptime(merged[-1][1], fmt) + timedelta(days=1):
+      merged[-1][1] = max(merged[-1][1], until)
+    else:
+      merged.append([since, until])
+  return merged
+
+
+class WindowPlanner():
+  """
+  Plans `time_entries` report windows per workspace from the row density
+  (rows per day) learned in previous windows and runs, aiming for about
+  `target_pages` pages per window: quiet workspaces get long windows, busy
+  ones short windows. Workspaces without history use 30-day windows.
+
+  Windows are planned lazily, so each one is sized from the windows of the
+  same workspace observed so far in this run: a window that comes back far
+  denser than expected shrinks the ones after it.
+
+  `densities` is the `window_density` dict kept in the stream's state; it
+  is updated in place by `finish()`.
+  """
+
+  def __init__(self, densities=None, page_size=50, target_pages=DEFAULT_TARGET_PAGES):
+    self.densities = densities if densities is not None else {}
+    self.page_size = max(int(page_size), 1)
+    self.target_pages = max(float(target_pages), 1.0)
+    self.observed = {}
+    self._lock = threading.Lock()
+
+
+  def density(self, workspace_id):
+    """ Rows per day expected for a workspace, or None without any history. """
+    with self._lock:
+      previous = self.densities.get(str(workspace_id))
+      days, rows = self.observed.get(workspace_id, (0, 0))
+    if not days:
+      return previous
+    density = rows / days
+    if previous is not None:
+      density = DENSITY_SMOOTHING * density + (1 - DENSITY_SMOOTHING) * previous
+    return density
+
+
+  def window_days(self, workspace_id):
+    density = self.density(workspace_id)
+    if density is None:
+      return DEFAULT_WINDOW_DAYS
+    if density <= 0:
+      return MAX_WINDOW_DAYS
+    days = int(self.target_pages * self.page_size / density)
+    return min(max(days, MIN_WINDOW_DAYS), MAX_WINDOW_DAYS)
+
+
+  def windows(self, workspace_id, start_date, end_date, fmt='%Y-%m-%d', clip=False):
+    """
+    Yield one workspace's (workspace_id, since, until) windows, each sized
+    when it is requested. Both dates are inclusive and consecutive windows
+    do not overlap. With `clip`, no window ends after `end_date`.
+    """
+    moving_start_date = start_date
+    while moving_start_date <= end_date:
+      moving_end_date = moving_start_date + timedelta(days=self.window_days(workspace_id) - 1)
+      if clip:
+        moving_end_date = min(moving_end_date, end_date)
+      yield (workspace_id, moving_start_date.strftime(fmt), moving_end_date.strftime(fmt))
+      moving_start_date = moving_end_date + timedelta(days=1)
+
+
+  def _uncovered_windows(self, workspace_id, start_date, end_date, covered, fmt):
+    # Plan only the gaps between date ranges a previous run already covered.
+    # Their bounds take `start_date`'s tzinfo so they compare with the range.
+    moving_start_date = start_date
+    for since, until in merge_ranges(covered, fmt):
+      since, until = (datetime.strptime(dates, fmt).replace(tzinfo=start_date.tzinfo) for dates in (since, until))
+      if since > moving_start_date:
+        yield from self.windows(workspace_id, moving_start_date, min(since - timedelta(days=1), end_date), fmt, clip=True)
+      moving_start_date = max(moving_start_date, until + timedelta(days=1))
+    yield from self.windows(workspace_id, moving_start_date, end_date, fmt)
+
+
+  def plan(self, workspace_ids, start_date, end_date, fmt='%Y-%m-%d', covered=None):
+    """
+    Yield (workspace_id, since, until) windows, interleaved across
+    workspaces. `covered` maps workspace ids to (since, until) date ranges
+    that are skipped.
+    """
+    covered = covered or {}
+    pending = [self._uncovered_windows(workspace_id, start_date, end_date, covered.get(workspace_id, []), fmt)
+               for workspace_id in workspace_ids]
+    while pending:
+      for windows in list(pending):
+        window = next(windows, None)
+        if window is None:
+          pending.remove(windows)
+        else:
+          yield window
+
+
+  def observe(self, workspace_id, days, rows):
+    with self._lock:
+      observed_days, observed_rows = self.observed.get(workspace_id, (0, 0))
+      self.observed[workspace_id] = (observed_days + days, observed_rows + rows)
+
+
+  def observe_window(self, window, rows, fmt='%Y-%m-%d'):
+    """ Record the rows returned by one planned (workspace_id, since, until) window. """
+    workspace_id, since, until = window
+    days = (datetime.strptime(until, fmt) - datetime.strptime(since, fmt)).days + 1
+    self.observe(workspace_id, days, rows)
+
+
+  def finish(self):
+    learned = {workspace_id: (days, rows, self.density(workspace_id))
+               for workspace_id, (days, rows) in self.observed.items() if days}
+    with self._lock:
+      self.observed = {}
+    for workspace_id, (days, rows, density) in learned.items():
+      self.densities[str(workspace_id)] = round(density, 3)
+      logger.info('Workspace {workspace_id}: {rows} time entries over {days} days, '
+                  'next windows {window_days} days ({pages} pages/window).'.format(
+                    workspace_id=workspace_id, rows=rows, days=days,
+                    window_days=self.window_days(workspace_id),
+                    pages=math.ceil(density * self.window_days(workspace_id) / self.page_size)))
+
+
+class ReportProgress():
+  """
+  Resumable `time_entries` progress, kept in the stream's state as the
+  `progress` bookmark so a sync that stops part way can skip finished work.
+
+  Per workspace it holds the merged date ranges of finished windows
+  (`completed`) and, for windows cut short, where their next page starts
+  (`pending`). Progress only applies to the report range starting at
+  `start_date`, which is derived from the `updated` bookmark; progress left
+  for another range is discarded, so the bookmark stays authoritative.
+  The dict is updated in place and must only be changed on the thread that
+  writes records and state.
+  """
+
+  def __init__(self, progress, start_date):
+    if progress.get('start_date') != start_date:
+      progress.clear()
+      progress.update({'start_date': start_date, 'workspaces': {}})
+    self.progress = progress
+
+
+  def _workspace(self, workspace_id):
+    return self.progress['workspaces'].setdefault(str(workspace_id), {'completed': [], 'pending': {}})
+
+
+  def pending(self):
+    """ Return [(window, cursor)] for the windows to resume. """
+    resumed = []
+    for workspace_id, workspace in self.progress['workspaces'].items():
+      for key, cursor in workspace['pending'].items():
+        since, until = key.split('/')
+        resumed.append(((int(workspace_id), since, until), cursor))
+    return resumed
+
+
+  def covered(self, workspace_id):
+    """ Date ranges of a workspace that are finished or will be resumed. """
+    workspace = self.progress['workspaces'].get(str(workspace_id))
+    if not workspace:
+      return []
+    return [tuple(dates) for dates in workspace['completed']] + [tuple(key.split('/')) for key in workspace['pending']]
+
+
+  def page_done(self, window, cursor):
+    workspace_id, since, until = window
+    self._workspace(workspace_id)['pending']['{}/{}'.format(since, until)] = cursor
+
+
+  def window_done(self, window):
+    workspace_id, since, until = window
+    workspace = self._workspace(workspace_id)
+    workspace['pending'].pop('{}/{}'.format(since, until), None)
+    workspace['completed'] = merge_ranges(workspace['completed'] + [[since, until]])
@@ -0,0 +1,38 @@
+#
+# Micro-benchmark for incremental bookmark comparisons.
+#
+#   python tests/benchmarks/bench_bookmarks.py
+#
+
+import timeit
+
+from singer import utils
+from tap_toggl.streams import Stream
+
+RECORDS = 100000
+BOOKMARK = "2023-06-01T12:00:00+00:00"
+VALUES = ["2023-06-{:02d}T{:02d}:15:30+00:00".format(i % 28 + 1, i % 24) for i in range(RECORDS)]
+STATE = {"bookmarks": {"bench": {"updated": BOOKMARK}}}
+
+
+def reparse_both_sides():
+    for value in VALUES:
+        utils.strptime_with_tz(value) > utils.strptime_with_tz(BOOKMARK)
+
+
+def cached_bookmark():
+    stream = Stream()
+    stream.name = "bench"
+    stream.replication_key = "updated"
+    for value in VALUES:
+        stream.is_bookmark_old(STATE, value)
+
+
+def main():
+    for name, func in (("reparse both sides", reparse_both_sides), ("cached bookmark", cached_bookmark)):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        print("{:<20} {:>8.2f} us/record".format(name, seconds / RECORDS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#
+# Micro-benchmark for datetime parsing: singer-python's dateutil-based
+# helpers against `tap_toggl.dates`, reported as seconds per million records.
+#
+#   python tests/benchmarks/bench_datetimes.py
+#
+
+import timeit
+
+from singer import Transformer, utils
+from singer.transform import string_to_datetime
+from tap_toggl import dates
+from tap_toggl.sync import DatetimeTransformer
+
+RECORDS = 100000
+# Every value distinct, as `start`/`stop` of time entries are.
+UNIQUE = ["2023-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}Z".format(i % 12 + 1, i % 28 + 1, i % 24, i % 60, i // 60 % 60)
+          for i in range(RECORDS)]
+# A few hundred distinct values, as bookmarks, window bounds and `at` are.
+REPEATED = [UNIQUE[i % 500] for i in range(RECORDS)]
+SCHEMA = {'type': 'object', 'properties': {
+    'id': {'type': ['null', 'integer']},
+    'start': {'type': ['null', 'string'], 'format': 'date-time'},
+    'stop': {'type': ['null', 'string'], 'format': 'date-time'},
+    'updated': {'type': ['null', 'string'], 'format': 'date-time'}}}
+ENTRIES = [{'id': i, 'start': UNIQUE[i], 'stop': UNIQUE[-i], 'updated': REPEATED[i]} for i in range(RECORDS)]
+
+
+def clear_memo():
+    dates._parse_iso.cache_clear()
+    dates.format_datetime.cache_clear()
+
+
+def each(parse, values):
+    def run():
+        clear_memo()
+        for value in values:
+            parse(value)
+    return run
+
+
+def transform(transformer_class):
+    def run():
+        clear_memo()
+        with transformer_class() as transformer:
+            for entry in ENTRIES:
+                transformer.transform(entry, SCHEMA)
+    return run
+
+
+CASES = (
+    ("parse, distinct values", (("strptime_with_tz", each(utils.strptime_with_tz, UNIQUE)),
+                                ("parse_datetime", each(dates.parse_datetime, UNIQUE)))),
+    ("parse, repeated values", (("strptime_with_tz", each(utils.strptime_with_tz, REPEATED)),
+                                ("parse_datetime", each(dates.parse_datetime, REPEATED)))),
+    ("format, distinct values", (("string_to_datetime", each(string_to_datetime, UNIQUE)),
+                                 ("format_datetime", each(dates.format_datetime, UNIQUE)))),
+    ("transform time entries", (("Transformer", transform(Transformer)),
+                                ("DatetimeTransformer", transform(DatetimeTransformer)))),
+)
+
+
+def main():
+    print("{:<26} {:<22} {:>14}".format("case", "implementation", "s / 1M records"))
+    for case, implementations in CASES:
+        for name, func in implementations:
+            seconds = min(timeit.repeat(func, number=1, repeat=3))
+            print("{:<26} {:<22} {:>14.2f}".format(case, name, seconds / RECORDS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
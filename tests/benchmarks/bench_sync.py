@@ -0,0 +1,142 @@
+#
+# End-to-end sync benchmark: runs `tap-toggl` in a subprocess against the
+# local mock Toggl server and reports throughput, requests, peak RSS and
+# time to first record.
+#
+#   python tests/benchmarks/bench_sync.py --workspaces 4 --time-entries 20000 --latency 0.01
+#   python tests/benchmarks/bench_sync.py --config max_workers=4 --config reports_api=v3
+#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_toggl import Dataset, MockTogglServer
+
+# Points the tap's endpoint constants at the mock server, then runs it.
+CHILD = '''
+import sys
+import tap_toggl
+import tap_toggl.toggl as toggl
+base_url = sys.argv.pop(1)
+toggl.BASE_URL = base_url + '/api'
+for name in ('REPORTS_V2_DETAILS_URL', 'REPORTS_V3_SEARCH_URL'):
+    setattr(toggl, name, getattr(toggl, name).replace('https://api.track.toggl.com', base_url))
+tap_toggl.main()
+'''
+
+
+def build_catalog(streams):
+    from tap_toggl.discover import discover_streams
+    catalog = {'streams': discover_streams()}
+    for stream in catalog['streams']:
+        if streams and stream['tap_stream_id'] not in streams:
+            continue
+        for entry in stream['metadata']:
+            entry['metadata']['selected'] = True
+    return catalog
+
+
+def parse_setting(setting):
+    name, _, value = setting.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def run_tap(server, config, catalog, state=None):
+    """ Run one sync and return its measurements. """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for name, content in (('config', config), ('catalog', catalog), ('state', state)):
+            if content is None:
+                continue
+            paths[name] = os.path.join(directory, name + '.json')
+            with open(paths[name], 'w') as f:
+                json.dump(content, f)
+        command = [sys.executable, '-c', CHILD, server.url]
+        for name, path in paths.items():
+            command += ['--' + name, path]
+
+        requests_before = server.stats.requests
+        throttled_before = server.stats.throttled
+        not_modified_before = server.stats.not_modified
+        records = 0
+        first_record = None
+        last_state = None
+        started = time.monotonic()
+        with open(os.path.join(directory, 'tap.log'), 'w') as log:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=log)
+            for line in process.stdout:
+                message = json.loads(line)
+                if message['type'] == 'RECORD':
+                    records += 1
+                    if first_record is None:
+                        first_record = time.monotonic() - started
+                elif message['type'] == 'STATE':
+                    last_state = message['value']
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.monotonic() - started
+        if process.returncode:
+            with open(os.path.join(directory, 'tap.log')) as log:
+                sys.stderr.write(log.read()[-4000:])
+            raise SystemExit('tap-toggl exited with status {}'.format(process.returncode))
+
+    return {
+        'records': records,
+        'seconds': elapsed,
+        'records_per_second': records / elapsed if elapsed else 0.0,
+        'requests': server.stats.requests - requests_before,
+        'throttled': server.stats.throttled - throttled_before,
+        'not_modified': server.stats.not_modified - not_modified_before,
+        # ru_maxrss is in kilobytes on Linux.
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'first_record_seconds': first_record,
+        'state': last_state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end tap-toggl benchmark against a mock server.')
+    parser.add_argument('--workspaces', type=int, default=2)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--time-entries', type=int, default=5000, help='per workspace')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth request with 429')
+    parser.add_argument('--streams', nargs='*', help='streams to select (default: all)')
+    parser.add_argument('--config', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra tap config, values parsed as JSON when possible')
+    parser.add_argument('--runs', type=int, default=1, help='syncs to run, each resuming from the previous state')
+    args = parser.parse_args()
+
+    dataset = Dataset(workspaces=args.workspaces, projects=args.projects, tasks=args.tasks,
+                      time_entries=args.time_entries)
+    config = {'api_token': 'bench', 'start_date': '2023-01-01T00:00:00Z', 'user_agent': 'bench',
+              'detailed_report_trailing_days': 1}
+    config.update(parse_setting(setting) for setting in args.config)
+    catalog = build_catalog(args.streams)
+
+    print('{} workspaces, {} time entries, latency {}s, 429 every {} requests'.format(
+        args.workspaces, dataset.total_time_entries, args.latency, args.throttle_every or 'never'))
+    print('{:>4} {:>9} {:>9} {:>11} {:>9} {:>9} {:>9} {:>9} {:>12}'.format(
+        'run', 'records', 'seconds', 'records/s', 'requests', 'throttled', '304s', 'rss MB', 'first rec s'))
+    state = None
+    with MockTogglServer(dataset, args.latency, args.throttle_every) as server:
+        for run in range(1, args.runs + 1):
+            result = run_tap(server, config, catalog, state)
+            state = result['state']
+            print('{:>4} {records:>9} {seconds:>9.2f} {records_per_second:>11.0f} {requests:>9} {throttled:>9} {not_modified:>9} '
+                  '{peak_rss_mb:>9.1f} {first:>12}'.format(
+                      run, first='-' if result['first_record_seconds'] is None else '{:.3f}'.format(result['first_record_seconds']),
+                      **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#
+# Local HTTP server emulating the Toggl v9 and Reports endpoints the tap
+# uses, for end-to-end benchmarks.
+#
+#   python tests/benchmarks/mock_toggl.py --workspaces 4 --time-entries 20000
+#
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+REPORTS_V2_PAGE_SIZE = 50
+TASKS_PAGE_SIZE = 200
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def isoformat(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Dataset():
+    """ Deterministic fake Toggl account: workspaces, their dimensions and time entries. """
+
+    def __init__(self, workspaces=2, projects=50, tasks=100, time_entries=5000, dimensions=10,
+                 start=START, days=365, seed=1):
+        rng = random.Random(seed)
+        self.workspaces = []
+        self.by_workspace = {}
+        self.groups = {}
+        next_id = iter(range(1, 1 << 62))
+        for index in range(workspaces):
+            workspace_id = 1000 + index
+            organization_id = 500 + index // 2
+            at = isoformat(start)
+            self.workspaces.append({'id': workspace_id, 'organization_id': organization_id,
+                                    'name': 'Workspace {}'.format(index), 'at': at})
+            self.groups.setdefault(organization_id, [
+                {'group_id': next(next_id), 'name': 'Group {}'.format(i), 'at': at} for i in range(dimensions)])
+            project_ids = [next(next_id) for _ in range(projects)]
+            entries = []
+            for _ in range(time_entries):
+                started = start + timedelta(seconds=rng.randrange(days * 86400))
+                seconds = rng.randrange(60, 4 * 3600)
+                entries.append({'id': next(next_id), 'project_id': rng.choice(project_ids) if project_ids else None,
+                                'user_id': rng.randrange(1, dimensions + 1), 'seconds': seconds,
+                                'start': started, 'stop': started + timedelta(seconds=seconds)})
+            entries.sort(key=lambda entry: (entry['start'], entry['id']))
+            self.by_workspace[workspace_id] = {
+                'clients': [{'id': next(next_id), 'wid': workspace_id, 'name': 'Client {}'.format(i), 'at': at} for i in range(dimensions)],
+                'projects': [{'id': project_id, 'workspace_id': workspace_id, 'name': 'Project {}'.format(project_id),
+                              'active': True, 'at': at} for project_id in project_ids],
+                'tasks': [{'id': next(next_id), 'workspace_id': workspace_id, 'name': 'Task {}'.format(i),
+                           'project_id': project_ids[i % len(project_ids)] if project_ids else None, 'at': at} for i in range(tasks)],
+                'tags': [{'id': next(next_id), 'workspace_id': workspace_id, 'name': 'Tag {}'.format(i), 'at': at} for i in range(dimensions)],
+                'users': [{'id': i, 'email': 'user{}@example.com'.format(i), 'fullname': 'User {}'.format(i)} for i in range(1, dimensions + 1)],
+                'workspace_users': [{'id': next(next_id), 'uid': i, 'wid': workspace_id, 'at': at} for i in range(1, dimensions + 1)],
+                'time_entries': entries,
+            }
+
+    def entries(self, workspace_id, since, until):
+        """ Entries started within the inclusive [since, until] dates. """
+        since = datetime.strptime(since, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        until = datetime.strptime(until, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+        return [entry for entry in self.by_workspace[workspace_id]['time_entries'] if since <= entry['start'] < until]
+
+    @property
+    def total_time_entries(self):
+        return sum(len(data['time_entries']) for data in self.by_workspace.values())
+
+
+def report_v2_row(workspace_id, entry):
+    return {'id': entry['id'], 'pid': entry['project_id'], 'uid': entry['user_id'], 'description': 'Entry',
+            'start': isoformat(entry['start']), 'end': isoformat(entry['stop']), 'updated': isoformat(entry['stop']),
+            'dur': entry['seconds'] * 1000, 'billable': None, 'tags': []}
+
+
+def report_v3_row(entry):
+    return {'user_id': entry['user_id'], 'username': 'User {}'.format(entry['user_id']), 'project_id': entry['project_id'],
+            'task_id': None, 'description': 'Entry', 'billable': False, 'tag_ids': [],
+            'time_entries': [{'id': entry['id'], 'seconds': entry['seconds'], 'start': isoformat(entry['start']),
+                              'stop': isoformat(entry['stop']), 'at': isoformat(entry['stop'])}]}
+
+
+class MockTogglHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockToggl/1.0'
+    # Headers and body are written separately; without this, delayed ACKs
+    # add ~40ms to every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        headers = dict(headers or {})
+        if self.command == 'GET' and status == 200:
+            # Conditional GETs get a bodiless 304 when nothing changed.
+            headers['ETag'] = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.server.stats.not_modified += 1
+                status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _admit(self):
+        """ Count the request, apply latency and decide whether to throttle it. """
+        self.server.stats.record(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.stats.should_throttle(self.server.throttle_every):
+            self._reply(429, {'error': 'Too Many Requests'}, {'Retry-After': '0'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._admit():
+            return
+        url = urlparse(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        data = self.server.dataset
+
+        if url.path == '/api/v9/me':
+            return self._reply(200, {'id': 1, 'email': 'bench@example.com'})
+        if url.path == '/api/v9/workspaces':
+            return self._reply(200, data.workspaces)
+        if parts[:3] == ['api', 'v9', 'organizations'] and len(parts) == 5 and parts[4] == 'groups':
+            return self._reply(200, data.groups.get(int(parts[3]), []))
+        if parts[:3] == ['api', 'v9', 'workspaces'] and len(parts) == 5:
+            workspace = data.by_workspace.get(int(parts[3]))
+            if workspace is None or parts[4] not in workspace or parts[4] == 'time_entries':
+                return self._reply(404, {'error': 'Not Found'})
+            items = workspace[parts[4]]
+            if parts[4] == 'tasks':
+                # Tasks are paged from 1 and wrapped in `data`.
+                page = max(int(query.get('page', 1)), 1)
+                per_page = int(query.get('per_page', TASKS_PAGE_SIZE))
+                return self._reply(200, {'data': items[(page - 1) * per_page:page * per_page], 'total_count': len(items)})
+            if 'per_page' in query:
+                page = max(int(query.get('page', 1)), 1)
+                per_page = int(query['per_page'])
+                items = items[(page - 1) * per_page:page * per_page]
+            return self._reply(200, items)
+        if url.path == '/reports/api/v2/details':
+            # Reports v2 pages hold 50 rows and start at page 1.
+            entries = data.entries(int(query['workspace_id']), query['since'], query['until'])
+            page = max(int(query.get('page', 1)), 1)
+            rows = entries[(page - 1) * REPORTS_V2_PAGE_SIZE:page * REPORTS_V2_PAGE_SIZE]
+            return self._reply(200, {'total_count': len(entries), 'per_page': REPORTS_V2_PAGE_SIZE,
+                                     'data': [report_v2_row(int(query['workspace_id']), entry) for entry in rows]})
+        return self._reply(404, {'error': 'Not Found'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self._admit():
+            return
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if len(parts) != 7 or parts[:4] != ['reports', 'api', 'v3', 'workspace'] or parts[5:] != ['search', 'time_entries']:
+            return self._reply(404, {'error': 'Not Found'})
+        entries = self.server.dataset.entries(int(parts[4]), body['start_date'], body['end_date'])
+        first = int(body.get('first_row_number', 1))
+        page_size = int(body.get('page_size', 50))
+        rows = entries[first - 1:first - 1 + page_size]
+        headers = {}
+        if first - 1 + page_size < len(entries):
+            headers = {'X-Next-Row-Number': str(first + page_size), 'X-Next-ID': str(rows[-1]['id'])}
+        return self._reply(200, [report_v3_row(entry) for entry in rows], headers)
+
+
+class RequestStats():
+    def __init__(self):
+        self.requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self.by_path = {}
+        self._lock = threading.Lock()
+
+    def record(self, path):
+        family = urlparse(path).path.rstrip('/').rsplit('/', 1)[-1]
+        with self._lock:
+            self.requests += 1
+            self.by_path[family] = self.by_path.get(family, 0) + 1
+
+    def should_throttle(self, every):
+        with self._lock:
+            if every and self.requests % every == 0:
+                self.throttled += 1
+                return True
+            return False
+
+
+class MockTogglServer():
+    """
+    Serve a `Dataset` on localhost. `latency` (seconds) is added to every
+    request and every `throttle_every`-th request is answered with a 429.
+    """
+
+    def __init__(self, dataset, latency=0.0, throttle_every=0, port=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MockTogglHandler)
+        self.server.daemon_threads = True
+        self.server.dataset = dataset
+        self.server.latency = latency
+        self.server.throttle_every = throttle_every
+        self.server.stats = RequestStats()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def stats(self):
+        return self.server.stats
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workspaces', type=int, default=2)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--time-entries', type=int, default=5000, help='per workspace')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth request with 429')
+    args = parser.parse_args()
+    dataset = Dataset(workspaces=args.workspaces, projects=args.projects, time_entries=args.time_entries)
+    with MockTogglServer(dataset, args.latency, args.throttle_every, args.port) as server:
+        print('Serving mock Toggl on {}'.format(server.url))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#
+# Module dependencies.
+#
+
+import asyncio
+import unittest
+
+import httpx
+
+from tap_toggl.async_toggl import AsyncToggl
+from tap_toggl.toggl import Topology, REPORTS_V2_PAGING
+
+
+WORKSPACES = [{'id': 1, 'organization_id': 10}, {'id': 2, 'organization_id': 10}]
+
+
+def build_client(handler, **kwargs):
+    client = AsyncToggl(api_token='token', start_date='2020-01-01T00:00:00Z', user_agent='test', **kwargs)
+    client._topology = Topology(WORKSPACES)
+    client._transport = httpx.MockTransport(handler)
+    return client
+
+
+class TestAsyncToggl(unittest.TestCase):
+    def test_workspace_endpoints_are_fetched_on_the_event_loop(self):
+        def handler(request):
+            workspace_id = int(request.url.path.split('/')[4])
+            return httpx.Response(200, json=[{'id': workspace_id * 100, 'at': '2023-01-01T00:00:00Z'}])
+
+        client = build_client(handler)
+        self.assertEqual([item['id'] for item in client.clients()], [100, 200])
+
+    def test_report_windows_are_paged_until_a_short_page(self):
+        pages = []
+
+        def handler(request):
+            page = int(request.url.params['page'])
+            pages.append(page)
+            data = [{'id': page, 'updated': '2023-01-01T00:00:00Z'}] * (50 if page < 2 else 1)
+            return httpx.Response(200, json={'data': data})
+
+        client = build_client(handler)
+        client.workspace_ids = [1]
+        items = list(client._get_from_endpoints(['https://example.com/details?workspace_id=1'], paging=REPORTS_V2_PAGING))
+        self.assertEqual(len(items), 51)
+        self.assertEqual(pages, [1, 2])
+
+    def test_endpoints_are_scheduled_through_a_bounded_window(self):
+        def handler(request):
+            return httpx.Response(200, json=[{'id': request.url.path}])
+
+        client = build_client(handler, max_concurrent_requests=2)
+        consumed = []
+
+        def endpoints():
+            for index in range(20):
+                consumed.append(index)
+                yield 'https://example.com/{}'.format(index)
+
+        async def first_result():
+            results = client.aget_from_endpoints(endpoints())
+            items = await results.__anext__()
+            await results.aclose()
+            return items
+
+        self.assertEqual(asyncio.run(first_result()), [{'id': '/0'}])
+        # Two slots, four tasks scheduled, one more after the first result.
+        self.assertEqual(len(consumed), 5)
+
+    def test_errors_are_raised_to_the_consumer(self):
+        def handler(request):
+            return httpx.Response(503)
+
+        client = build_client(handler)
+        with self.assertRaises(httpx.HTTPStatusError):
+            list(client.clients())
+
+
+if __name__ == '__main__':
+    unittest.main()
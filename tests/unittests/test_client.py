@@ -0,0 +1,441 @@
+#
+# Module dependencies.
+#
+
+import hashlib
+import json
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import tap_toggl.toggl as toggl
+from tap_toggl.toggl import Toggl, Topology
+
+
+class FakeTogglHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    routes = {}
+
+    def do_GET(self):
+        body = json.dumps(self.routes.get(self.path.split('?')[0], [])).encode()
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeTogglServer():
+    def __init__(self, routes):
+        handler = type('Handler', (FakeTogglHandler,), {'routes': routes})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.base_url = 'http://127.0.0.1:{}/api'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+WORKSPACES = [{'id': 1, 'organization_id': 10}, {'id': 2, 'organization_id': 10}]
+
+
+class TestSession(unittest.TestCase):
+    def test_session_reuses_connections(self):
+        routes = {'/api/v9/workspaces': WORKSPACES, '/api/v9/me': {'id': 5}}
+        with FakeTogglServer(routes) as server, mock.patch.object(toggl, 'BASE_URL', server.base_url):
+            client = Toggl(api_token='token', start_date='2020-01-01T00:00:00Z', user_agent='test')
+            client.is_authorized()
+            list(client.clients())
+            stats = client.connection_stats()
+            client.close()
+
+        self.assertEqual(client.workspace_ids, [1, 2])
+        self.assertEqual(client.telemetry.families['clients']['requests'], 2)
+        self.assertGreater(client.telemetry.families['workspaces']['bytes'], 0)
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['reused'], 3)
+
+    def test_streamed_responses(self):
+        routes = {'/api/v9/workspaces': WORKSPACES,
+                  '/api/v9/workspaces/1/clients': [{'id': 11}],
+                  '/api/v9/workspaces/2/clients': [{'id': 21}, {'id': 22}]}
+        with FakeTogglServer(routes) as server, mock.patch.object(toggl, 'BASE_URL', server.base_url):
+            client = Toggl(api_token='token', stream_json=True)
+            self.assertEqual([item['id'] for item in client.clients()], [11, 21, 22])
+            client.close()
+
+    def test_broken_streams_are_resumed(self):
+        client = build_client(stream_json=True)
+        bodies = [[b'[{"id": 1}, ', requests.exceptions.ChunkedEncodingError('reset')],
+                  [b'[{"id": 1}, {"id": 2}]']]
+
+        def open_stream(url):
+            chunks = bodies.pop(0)
+            def iter_content(chunk_size):
+                for chunk in chunks:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            return mock.MagicMock(iter_content=iter_content)
+
+        with mock.patch.object(client, '_open_stream', side_effect=open_stream), \
+             mock.patch.object(toggl.time, 'sleep'):
+            self.assertEqual(list(client._get_streamed('https://example.com')), [{'id': 1}, {'id': 2}])
+
+    def test_unchanged_dimensions_are_served_from_the_http_cache(self):
+        routes = {'/api/v9/workspaces': WORKSPACES,
+                  '/api/v9/workspaces/1/clients': [{'id': 11}],
+                  '/api/v9/workspaces/2/clients': [{'id': 21}]}
+        with FakeTogglServer(routes) as server, mock.patch.object(toggl, 'BASE_URL', server.base_url), \
+                tempfile.TemporaryDirectory() as directory:
+            runs = []
+            for bypass in (False, False, True):
+                client = Toggl(api_token='token', http_cache_dir=directory, http_cache_bypass=bypass, stream_json=True)
+                ids = [item['id'] for item in client.clients()]
+                runs.append((ids, dict(client.telemetry.families['clients']['status_codes'])))
+                client.close()
+            other_account = Toggl(api_token='other', http_cache_dir=directory)
+            list(other_account.clients())
+
+        self.assertEqual(runs[0], ([11, 21], {200: 2}))
+        self.assertEqual(runs[1], ([11, 21], {304: 2}))
+        self.assertEqual(runs[2], ([11, 21], {200: 2}))
+        self.assertEqual(dict(other_account.telemetry.families['clients']['status_codes']), {200: 2})
+
+    def test_keep_alive_can_be_disabled(self):
+        client = build_client(keep_alive='false')
+        self.assertEqual(client.session.headers['Connection'], 'close')
+
+
+def build_client(**kwargs):
+    client = Toggl(api_token='token', start_date='2020-01-01T00:00:00Z', user_agent='test', **kwargs)
+    client._topology = Topology(WORKSPACES)
+    return client
+
+
+def slow_response(endpoint, key=None, markers=False, paging=None):
+    # Later endpoints finish first.
+    time.sleep(0.05 / int(endpoint))
+    yield endpoint
+
+
+class TestTopology(unittest.TestCase):
+    def test_client_construction_makes_no_requests(self):
+        with mock.patch.object(Toggl, '_get') as get:
+            client = Toggl(api_token='token')
+        get.assert_not_called()
+        with mock.patch.object(Toggl, '_get', return_value=WORKSPACES) as get:
+            self.assertEqual(client.workspace_ids, [1, 2])
+            self.assertEqual(client.organization_ids, [10])
+        get.assert_called_once()
+
+    def test_workspaces_are_fetched_once_and_organizations_deduplicated(self):
+        routes = {'/api/v9/workspaces': WORKSPACES + [{'id': 3, 'organization_id': 30}]}
+        with FakeTogglServer(routes) as server, mock.patch.object(toggl, 'BASE_URL', server.base_url):
+            client = Toggl(api_token='token')
+            workspaces = list(client.workspaces())
+            workspaces[0]['id'] = 'mutated'
+            self.assertEqual(list(client.workspaces())[0]['id'], 1)
+            # The first workspaces() call loads the response and the second one
+            # is served from the cache. The lazily built topology reuses it too.
+            self.assertEqual(client.cache.hits, 1)
+            self.assertEqual(client.organization_ids, [10, 30])
+            self.assertEqual(client.cache.hits, 2)
+            requests_made = client.connection_stats()['requests']
+
+        self.assertEqual(requests_made, 1)
+        self.assertEqual(client.topology.duplicate_organizations, 1)
+
+
+class TestFanOut(unittest.TestCase):
+    def test_ordered_fan_out_keeps_endpoint_order(self):
+        client = build_client(max_workers=3)
+        endpoints = [str(i) for i in range(1, 7)]
+        with mock.patch.object(client, '_get_response', side_effect=slow_response):
+            self.assertEqual(list(client._get_from_endpoints(endpoints)), endpoints)
+
+    def test_as_completed_fan_out_yields_every_endpoint(self):
+        client = build_client(max_workers=3, fan_out_order='as_completed')
+        endpoints = [str(i) for i in range(1, 7)]
+        with mock.patch.object(client, '_get_response', side_effect=slow_response):
+            self.assertCountEqual(list(client._get_from_endpoints(endpoints)), endpoints)
+
+    def test_fan_out_buffers_bounded_batches_and_stops_with_consumer(self):
+        client = build_client(max_workers=2)
+        produced = []
+
+        def endless(job):
+            while True:
+                produced.append(job)
+                yield job
+
+        items = client._fetch_all(endless, ['a', 'b', 'c'])
+        self.assertEqual([next(items) for _ in range(10)], ['a'] * 10)
+        time.sleep(0.2)
+        items.close()
+        time.sleep(0.2)
+        count = len(produced)
+
+        # Four jobs in flight, each holding at most its queue plus one batch.
+        bound = 4 * (toggl.FAN_OUT_QUEUE_BATCHES + 2) * toggl.FAN_OUT_BATCH_SIZE
+        self.assertLess(count, bound)
+        time.sleep(0.2)
+        self.assertEqual(len(produced), count)
+
+    def test_fan_out_raises_worker_errors(self):
+        client = build_client(max_workers=2)
+
+        def failing(job):
+            yield job
+            raise ValueError(job)
+
+        with self.assertRaises(ValueError):
+            list(client._fetch_all(failing, ['a', 'b']))
+
+
+class TestServerSideFilters(unittest.TestCase):
+    def test_bookmark_is_sent_as_since(self):
+        client = build_client()
+        with mock.patch.object(client, '_get_response', return_value=iter([])) as get_response:
+            list(client.projects('at', '2023-01-01T00:00:00Z'))
+            list(client.tasks('at', '2023-01-01T00:00:00Z'))
+        urls = [call.args[0] for call in get_response.call_args_list]
+        self.assertTrue(urls[0].endswith('/workspaces/1/projects?since=1672531200'))
+        self.assertTrue(urls[-1].endswith('/workspaces/2/tasks?since=1672531200'))
+
+    def test_filters_can_be_disabled(self):
+        client = build_client(server_side_filters=False)
+        with mock.patch.object(client, '_get_response', return_value=iter([])) as get_response:
+            list(client.projects('at', '2023-01-01T00:00:00Z'))
+        self.assertTrue(get_response.call_args.args[0].endswith('/workspaces/2/projects'))
+
+
+class TestPagination(unittest.TestCase):
+    def test_pages_are_requested_at_full_size_until_a_short_one(self):
+        client = build_client()
+        client.workspace_ids = [1]
+        urls = []
+
+        def fake_request(method, url, **kwargs):
+            urls.append(url)
+            page = int(parse_qs(urlparse(url).query)['page'][0])
+            response = mock.Mock(status_code=200, content=b'', headers={})
+            response.json.return_value = [{'id': page * 1000 + i} for i in range(200 if page < 3 else 7)]
+            return response
+
+        with mock.patch.object(client.session, 'request', side_effect=fake_request):
+            projects = list(client.projects())
+
+        self.assertEqual(len(projects), 407)
+        self.assertEqual([parse_qs(urlparse(url).query) for url in urls],
+                         [{'page': [str(page)], 'per_page': ['200']} for page in (1, 2, 3)])
+
+    def test_v2_report_pages_start_at_one_and_stop_on_a_short_page(self):
+        client = build_client()
+        pages = []
+
+        def fake_request(method, url, **kwargs):
+            query = parse_qs(urlparse(url).query)
+            pages.append(query['page'])
+            self.assertNotIn('per_page', query)
+            response = mock.Mock(status_code=200, content=b'', headers={})
+            response.json.return_value = {'data': [{'id': i} for i in range(50 if query['page'] == ['1'] else 3)]}
+            return response
+
+        with mock.patch.object(client.session, 'request', side_effect=fake_request):
+            items = list(client._get_response('https://example.com/details?workspace_id=1', markers=True,
+                                              paging=toggl.REPORTS_V2_PAGING))
+
+        self.assertEqual(pages, [['1'], ['2']])
+        markers = [(item.cursor, item.rows) for item in items if isinstance(item, toggl.PageEnd)]
+        self.assertEqual(markers, [(2, 50), (None, 3)])
+
+
+class TestReportWindows(unittest.TestCase):
+    def test_report_range_is_whole_utc_days(self):
+        client = build_client()
+        start, end = client._report_range('2023-01-05T23:30:00-05:00')
+        self.assertEqual(start, datetime(2023, 1, 4, tzinfo=timezone.utc))
+        self.assertEqual(end.strftime('%Y-%m-%d %H:%M:%S %z'), datetime.today().strftime('%Y-%m-%d 00:00:00 +0000'))
+        self.assertEqual(client._report_range(None)[0], datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    def test_windows_respect_global_concurrency_cap(self):
+        client = build_client(report_workers=4, max_concurrent_requests=2)
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def fake_request(method, url, **kwargs):
+            with lock:
+                in_flight.append(url)
+                peak.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(url)
+            response = mock.Mock(status_code=200, content=b'', headers={})
+            response.json.return_value = {'data': []}
+            return response
+
+        with mock.patch.object(client.session, 'request', side_effect=fake_request) as request:
+            self.assertEqual(list(client.time_entries('updated', '2023-01-01T00:00:00Z')), [])
+
+        self.assertGreater(request.call_count, 2)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_v2_rows_are_counted_per_window_workspace(self):
+        client = build_client()
+        client.window_density = {'1': 0.0, '2': 0.0}
+
+        def fake_request(method, url, **kwargs):
+            query = parse_qs(urlparse(url).query)
+            # Reports v2 rows carry no workspace id.
+            data = [{'id': i, 'updated': '2023-01-02T00:00:00Z'} for i in range(50)]
+            busy = query['workspace_id'] == ['1'] and query['page'] == ['1']
+            response = mock.Mock(status_code=200, content=b'', headers={})
+            response.json.return_value = {'data': data if busy else []}
+            return response
+
+        with mock.patch.object(client.session, 'request', side_effect=fake_request):
+            entries = list(client.time_entries('updated', '2023-01-01T00:00:00Z'))
+
+        self.assertGreater(len(entries), 0)
+        self.assertGreater(client.window_density['1'], 0)
+        self.assertEqual(client.window_density['2'], 0)
+
+
+class TestReportsV3(unittest.TestCase):
+    def test_cursor_pagination_maps_rows_to_schema(self):
+        client = build_client(reports_api='v3', reports_page_size=2)
+        client.workspace_ids = [1]
+        first = mock.Mock(status_code=200, content=b'', headers={'X-Next-ID': '11', 'X-Next-Row-Number': '3'})
+        first.json.return_value = [
+            {'user_id': 7, 'username': 'Ann', 'project_id': 3, 'task_id': None, 'description': 'a', 'billable': True,
+             'tag_ids': [1], 'time_entries': [{'id': 10, 'seconds': 60, 'start': 's', 'stop': 'e', 'at': '2023-01-02T00:00:00Z'}]},
+            {'user_id': 7, 'username': 'Ann', 'time_entries': [{'id': 11, 'at': '2023-01-03T00:00:00Z'}]}
+        ]
+        last = mock.Mock(status_code=200, content=b'', headers={})
+        last.json.return_value = [{'user_id': 8, 'time_entries': [{'id': 12, 'at': '2023-01-04T00:00:00Z'}]}]
+
+        with mock.patch.object(client, '_report_windows', return_value=[(1, '2023-01-01', '2023-01-31')]), \
+                mock.patch.object(client.session, 'request', side_effect=[first, last]) as request:
+            entries = list(client.time_entries('updated', None))
+
+        self.assertEqual([entry['id'] for entry in entries], [10, 11, 12])
+        self.assertEqual(entries[0]['project_id'], 3)
+        self.assertEqual(entries[0]['duration'], 60)
+        self.assertEqual(entries[0]['user_name'], 'Ann')
+        self.assertEqual(entries[2]['updated'], '2023-01-04T00:00:00Z')
+        self.assertEqual(request.call_args_list[0].args[0], 'POST')
+        self.assertEqual(request.call_args_list[1].kwargs['json']['first_row_number'], 3)
+        self.assertEqual(request.call_args_list[1].kwargs['json']['first_id'], 11)
+        self.assertEqual(request.call_args_list[1].kwargs['json']['page_size'], 2)
+
+    def test_pages_are_counted_per_window(self):
+        client = build_client(reports_api='v3', reports_page_size=1)
+        client.workspace_ids = [1]
+        entries = [{'id': i, 'at': '2023-01-02T00:00:00Z'} for i in range(3)]
+        first = mock.Mock(status_code=200, content=b'', headers={'X-Next-Row-Number': '2'})
+        first.json.return_value = [{'user_id': 7, 'time_entries': entries}]
+        last = mock.Mock(status_code=200, content=b'', headers={})
+        last.json.return_value = [{'user_id': 8, 'time_entries': entries}]
+        empty = mock.Mock(status_code=200, content=b'', headers={})
+        empty.json.return_value = []
+
+        windows = [(1, '2023-01-01', '2023-01-31'), (1, '2023-02-01', '2023-02-28')]
+        with mock.patch.object(client, '_report_windows', return_value=windows), \
+                mock.patch.object(client.session, 'request', side_effect=[first, last, empty]), \
+                mock.patch.object(client.telemetry, 'report_window') as report_window:
+            self.assertEqual(len(list(client.time_entries('updated', None))), 6)
+
+        # Six time entries arrived on two report pages; the empty window took one request.
+        self.assertEqual([call.args for call in report_window.call_args_list],
+                         [('reports_v3_search', windows[0], 2), ('reports_v3_search', windows[1], 1)])
+
+    def test_interrupted_windows_resume_from_their_cursor(self):
+        def run(fail_at=None):
+            bodies = []
+
+            def fake_request(method, url, json=None, **kwargs):
+                bodies.append(dict(json))
+                row_number = json.get('first_row_number', 1)
+                if (json['start_date'], row_number) == fail_at:
+                    raise RuntimeError('crash')
+                # Two single-entry pages per window.
+                entry = {'id': row_number, 'at': '2023-01-02T00:00:00Z'}
+                headers = {'X-Next-Row-Number': '2', 'X-Next-ID': '1'} if row_number == 1 else {}
+                response = mock.Mock(status_code=200, content=b'', headers=headers)
+                response.json.return_value = [{'user_id': 7, 'time_entries': [entry]}]
+                return response
+
+            with mock.patch.object(client, '_report_range', return_value=(datetime(2023, 1, 1, tzinfo=timezone.utc),
+                                                                          datetime(2023, 2, 15, tzinfo=timezone.utc))), \
+                    mock.patch.object(client.session, 'request', side_effect=fake_request):
+                entries = []
+                try:
+                    for entry in client.time_entries('updated', None):
+                        entries.append(entry)
+                except RuntimeError:
+                    pass
+            return entries, bodies
+
+        client = build_client(reports_api='v3', reports_page_size=1)
+        client.workspace_ids = [1]
+        progress = {}
+        client.report_progress = progress
+        entries, _ = run(fail_at=('2023-01-01', 2))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(progress['workspaces']['1']['pending'],
+                         {'2023-01-01/2023-01-30': {'first_row_number': 2, 'first_id': 1}})
+
+        entries, bodies = run()
+        self.assertEqual(len(entries), 3)
+        self.assertEqual((bodies[0]['start_date'], bodies[0]['first_row_number']), ('2023-01-01', 2))
+        self.assertEqual([body['start_date'] for body in bodies[1:]], ['2023-01-31', '2023-01-31'])
+        self.assertEqual(progress['workspaces']['1'], {'completed': [['2023-01-01', '2023-03-01']], 'pending': {}})
+
+    def test_completed_ranges_are_skipped_through_the_real_report_range(self):
+        client = build_client(reports_api='v3')
+        client.workspace_ids = [1]
+        client.report_progress = {'start_date': '2020-01-01',
+                                  'workspaces': {'1': {'completed': [['2020-01-01', '2020-01-10']], 'pending': {}}}}
+        bodies = []
+
+        def fake_request(method, url, json=None, **kwargs):
+            bodies.append(dict(json))
+            response = mock.Mock(status_code=200, content=b'', headers={})
+            response.json.return_value = []
+            return response
+
+        with mock.patch.object(client.session, 'request', side_effect=fake_request):
+            self.assertEqual(list(client.time_entries('updated', None)), [])
+
+        self.assertEqual(bodies[0]['start_date'], '2020-01-11')
+        self.assertEqual(client.report_progress['workspaces']['1']['completed'][0][0], '2020-01-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#
+# Module dependencies.
+#
+
+import unittest
+
+from tap_toggl.dedup import RecordDeduplicator, record_digest
+
+
+class TestRecordDeduplicator(unittest.TestCase):
+    def test_repeats_of_the_same_version_are_duplicates(self):
+        dedup = RecordDeduplicator()
+        self.assertFalse(dedup.is_duplicate(1, '2023-01-01T00:00:00Z'))
+        self.assertTrue(dedup.is_duplicate(1, '2023-01-01T00:00:00Z'))
+        # A changed entry is emitted again.
+        self.assertFalse(dedup.is_duplicate(1, '2023-01-02T00:00:00Z'))
+        self.assertFalse(dedup.is_duplicate(2, '2023-01-01T00:00:00Z'))
+        self.assertEqual(dedup.suppressed, 1)
+
+    def test_memory_is_bounded(self):
+        dedup = RecordDeduplicator(max_entries=4)
+        for key in range(10):
+            dedup.is_duplicate(key, 'v')
+        self.assertLessEqual(len(dedup.seen), 4)
+        self.assertTrue(dedup.is_duplicate(9, 'v'))
+        # Forgotten keys fail open: emitted again rather than dropped.
+        self.assertFalse(dedup.is_duplicate(0, 'v'))
+
+    def test_zero_disables_deduplication(self):
+        dedup = RecordDeduplicator(max_entries=0)
+        self.assertFalse(dedup.is_duplicate(1, 'v'))
+        self.assertFalse(dedup.is_duplicate(1, 'v'))
+
+
+class TestRecordDigest(unittest.TestCase):
+    def test_digest_depends_on_content_not_key_order(self):
+        self.assertEqual(record_digest({'id': 1, 'name': 'a'}), record_digest({'name': 'a', 'id': 1}))
+        self.assertNotEqual(record_digest({'id': 1, 'name': 'a'}), record_digest({'id': 1, 'name': 'b'}))
+        self.assertEqual(len(record_digest({'id': 1})), 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
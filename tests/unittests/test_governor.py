@@ -0,0 +1,67 @@
+#
+# Module dependencies.
+#
+
+import time
+import unittest
+from unittest import mock
+
+from tap_toggl.governor import RequestGovernor, parse_retry_after
+from tap_toggl.toggl import Toggl
+
+
+class TestRequestGovernor(unittest.TestCase):
+    def test_retry_after_pauses_and_halves_concurrency(self):
+        governor = RequestGovernor(8)
+        self.assertEqual(governor.try_acquire(), 0)
+        governor.release(429, {'Retry-After': '2'}, 0.1)
+
+        self.assertEqual(governor.limit, 4)
+        self.assertGreater(governor.try_acquire(), 1.5)
+        self.assertEqual(governor.stats()['throttled'], 1)
+
+    def test_concurrency_recovers_after_healthy_responses(self):
+        governor = RequestGovernor(4)
+        governor.limit = 2
+        for _ in range(2):
+            governor.try_acquire()
+            governor.release(200, {}, 0.1)
+        self.assertEqual(governor.limit, 3)
+
+    def test_slow_responses_reduce_concurrency(self):
+        governor = RequestGovernor(4, latency_target=1)
+        governor.try_acquire()
+        governor.release(200, {}, 5)
+        self.assertEqual(governor.limit, 2)
+
+    def test_token_bucket_limits_rate(self):
+        governor = RequestGovernor(10, rate=10, burst=1)
+        self.assertEqual(governor.try_acquire(), 0)
+        self.assertAlmostEqual(governor.try_acquire(), 0.1, delta=0.02)
+
+    def test_exhausted_quota_pauses_until_reset(self):
+        governor = RequestGovernor(4)
+        governor.try_acquire()
+        governor.release(200, {'X-Toggl-Quota-Remaining': '0', 'X-Toggl-Quota-Resets-In': '30'}, 0.1)
+        self.assertGreater(governor.try_acquire(), 29)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestThrottledRequests(unittest.TestCase):
+    def test_429_is_retried_after_retry_after(self):
+        client = Toggl(api_token='token')
+
+        throttled = mock.Mock(status_code=429, content=b'', headers={'Retry-After': '0.01'})
+        ok = mock.Mock(status_code=200, content=b'', headers={})
+        ok.json.return_value = {'id': 1}
+        with mock.patch.object(client.session, 'request', side_effect=[throttled, ok]):
+            self.assertEqual(client.is_authorized(), {'id': 1})
+        self.assertEqual(client.governor.stats()['requests'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#
+# Module dependencies.
+#
+
+import os
+import tempfile
+import unittest
+from tap_toggl.http_cache import HttpCache
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_bodies_are_stored_with_their_validators(self):
+        cache = HttpCache(self.directory.name, namespace='token')
+        self.assertIsNone(cache.lookup('https://example.com/a'))
+        cache.store('https://example.com/a', {'ETag': '"1"', 'Last-Modified': 'Sun, 01 Jan 2023 00:00:00 GMT'}, b'[1]')
+
+        entry = HttpCache(self.directory.name, namespace='token').lookup('https://example.com/a')
+        self.assertEqual(entry[1], b'[1]')
+        self.assertEqual(cache.conditional_headers(entry),
+                         {'If-None-Match': '"1"', 'If-Modified-Since': 'Sun, 01 Jan 2023 00:00:00 GMT'})
+        self.assertIsNone(HttpCache(self.directory.name, namespace='other').lookup('https://example.com/a'))
+        self.assertIsNone(HttpCache(self.directory.name, namespace='token', bypass=True).lookup('https://example.com/a'))
+
+    def test_responses_without_validators_replace_nothing(self):
+        cache = HttpCache(self.directory.name)
+        cache.store('https://example.com/a', {'ETag': '"1"'}, b'[1]')
+        cache.store('https://example.com/a', {}, b'[2]')
+        self.assertIsNone(cache.lookup('https://example.com/a'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = HttpCache(self.directory.name, max_bytes=400)
+        for index, url in enumerate(('https://example.com/a', 'https://example.com/b')):
+            cache.store(url, {'ETag': '"1"'}, b'x' * 100)
+            os.utime(cache._path(cache._key(url)), (index, index))
+            cache._index[cache._key(url)][1] = index
+        cache.hit('https://example.com/a')
+        cache.store('https://example.com/c', {'ETag': '"1"'}, b'x' * 100)
+
+        self.assertEqual(cache.evicted, 1)
+        self.assertIsNotNone(cache.lookup('https://example.com/a'))
+        self.assertIsNone(cache.lookup('https://example.com/b'))
+        self.assertIsNotNone(cache.lookup('https://example.com/c'))
+
+    def test_unreadable_entries_are_discarded(self):
+        cache = HttpCache(self.directory.name)
+        with open(cache._path(cache._key('https://example.com/a')), 'wb') as f:
+            f.write(b'not json\n[1]')
+        self.assertIsNone(cache.lookup('https://example.com/a'))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#
+# Module dependencies.
+#
+
+import json
+import unittest
+
+from tap_toggl.jsonstream import iter_items
+
+
+def chunked(document, size):
+    data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterItems(unittest.TestCase):
+    def test_top_level_array_across_chunk_boundaries(self):
+        items = [{'id': 123456789, 'name': 'Zoë ✓', 'rate': 1.5e3}, 987654321, 'x', None, [1, [2]]]
+        for size in (1, 2, 3, 7, 1000):
+            self.assertEqual(list(iter_items(chunked(items, size))), items)
+
+    def test_data_member_of_object(self):
+        document = {'total_count': 3, 'meta': {'data': [0]}, 'data': [{'id': 1}, {'id': 2}], 'total_grand': 7}
+        for size in (1, 5, 1000):
+            self.assertEqual(list(iter_items(chunked(document, size), 'data')), [{'id': 1}, {'id': 2}])
+
+    def test_empty_and_null_bodies(self):
+        self.assertEqual(list(iter_items([b''])), [])
+        self.assertEqual(list(iter_items([b'null'])), [])
+        self.assertEqual(list(iter_items([b'[ ]'])), [])
+        self.assertEqual(list(iter_items([b'{"data": []}'], 'data')), [])
+
+    def test_items_are_yielded_before_the_body_ends(self):
+        def chunks():
+            yield b'[{"id": 1}, '
+            raise AssertionError('read too far')
+
+        self.assertEqual(next(iter_items(chunks())), {'id': 1})
+
+    def test_truncated_body_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_items([b'[{"id": 1}, {"id"']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#
+# Module dependencies.
+#
+
+import decimal
+import io
+import json
+import unittest
+from unittest import mock
+
+import singer
+import tap_toggl.output as output
+from tap_toggl.output import BufferedWriter
+
+
+class TestBufferedWriter(unittest.TestCase):
+    def test_buffer_is_flushed_with_state(self):
+        out = io.BytesIO()
+        writer = BufferedWriter(out=out, buffer_bytes=1 << 20, flush_seconds=3600)
+        writer.write_schema('tags', {'type': 'object'}, 'id')
+        writer.write_record('tags', {'id': 1, 'name': 'é'})
+        self.assertEqual(out.getvalue(), b'')
+
+        writer.write_state({'bookmarks': {}})
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['SCHEMA', 'RECORD', 'STATE'])
+        self.assertEqual(lines[1], json.loads(singer.format_message(singer.RecordMessage('tags', {'id': 1, 'name': 'é'}))))
+        self.assertEqual(lines[0]['key_properties'], ['id'])
+
+    def test_buffer_is_flushed_when_full(self):
+        out = io.BytesIO()
+        writer = BufferedWriter(out=out, buffer_bytes=64, flush_seconds=3600)
+        writer.write_record('tags', {'id': 1})
+        self.assertEqual(out.getvalue(), b'')
+        writer.write_record('tags', {'id': 2, 'name': 'x' * 64})
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+    def test_decimals_are_encoded_exactly(self):
+        message = singer.RecordMessage('tags', {'id': decimal.Decimal('0.1000000000000000055511151231257827')})
+        encoded = output.encode_message(message)
+        self.assertEqual(encoded, singer.format_message(message).encode('utf-8') + b'\n')
+        self.assertIn(b'0.1000000000000000055511151231257827', encoded)
+
+    def test_falls_back_to_singer_encoding(self):
+        with mock.patch.object(output, 'orjson', None):
+            encoded = output.encode_message(singer.StateMessage(value={'a': 1}))
+        self.assertEqual(json.loads(encoded), {'type': 'STATE', 'value': {'a': 1}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#
+# Module dependencies.
+#
+
+import unittest
+from singer import metadata, Transformer
+from tap_toggl.projection import compile_projection, project
+from tap_toggl.streams import Projects
+
+
+def projects_catalog(deselected=()):
+    instance = Projects()
+    schema = instance.load_schema()
+    mdata = metadata.to_map(instance.load_metadata())
+    for field_name in deselected:
+        mdata = metadata.write(mdata, ('properties', field_name), 'selected', False)
+    return schema, mdata
+
+
+class TestProjection(unittest.TestCase):
+    def test_deselected_fields_are_dropped_but_automatic_ones_kept(self):
+        schema, mdata = projects_catalog(deselected=('name', 'at', 'id'))
+        fields = compile_projection(schema, mdata)
+        self.assertIn('id', fields)
+        self.assertIn('at', fields)
+        self.assertNotIn('name', fields)
+        self.assertIn('active', fields)
+
+    def test_projection_matches_the_transformer(self):
+        schema, mdata = projects_catalog(deselected=('name', 'color'))
+        record = {'id': 1, 'name': 'Project', 'color': '#fff', 'active': True,
+                  'at': '2023-01-01T00:00:00Z', 'not_in_schema': {'nested': [1, 2]}}
+        fields = compile_projection(schema, mdata)
+        projected = project(record, fields)
+        self.assertEqual(projected, {'id': 1, 'active': True, 'at': '2023-01-01T00:00:00Z'})
+        with Transformer() as transformer:
+            self.assertEqual(transformer.transform(dict(projected), schema, mdata),
+                             transformer.transform(dict(record), schema, mdata))
+
+    def test_fields_to_keep_survive_even_outside_the_schema(self):
+        schema, mdata = projects_catalog(deselected=('name',))
+        fields = compile_projection(schema, mdata, keep=('id', 'name', 'updated', None))
+        self.assertIn('name', fields)
+        self.assertEqual(fields[-1], 'updated')
+        self.assertEqual(fields.count('id'), 1)
+
+    def test_schemas_without_properties_are_not_projected(self):
+        self.assertIsNone(compile_projection({'type': 'object'}, {}))
+        self.assertEqual(project({'a': 1}, None), {'a': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#
+# Module dependencies.
+#
+
+import copy
+import io
+import json
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import tap_toggl.sync as sync
+import singer
+from tap_toggl.streams import Clients
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+
+
+def build_instance(records):
+    instance = Clients()
+    schema = {'type': 'object', 'properties': {'id': {'type': ['null', 'integer']},
+                                               'at': {'type': ['null', 'string'], 'format': 'date-time'}}}
+    instance.stream = CatalogEntry(tap_stream_id='clients', stream='clients',
+                                   schema=Schema.from_dict(schema), metadata=instance.load_metadata())
+    instance.sync = lambda state: ((instance.stream, dict(record)) for record in records)
+    return instance
+
+
+def messages(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+class TestSyncStream(unittest.TestCase):
+    def test_transformer_is_built_once_per_stream(self):
+        records = [{'id': i, 'at': '2023-01-0{}T00:00:00Z'.format(i)} for i in range(1, 4)]
+        instance = build_instance(records)
+        output = io.StringIO()
+        with mock.patch.object(sync, 'DatetimeTransformer', wraps=sync.DatetimeTransformer) as transformer, \
+                mock.patch.object(sync.metadata, 'to_map', wraps=sync.metadata.to_map) as to_map, \
+                redirect_stdout(output):
+            self.assertEqual(sync.sync_stream({}, instance), 3)
+
+        self.assertEqual(transformer.call_count, 1)
+        self.assertEqual(to_map.call_count, 1)
+        records = [m['record'] for m in messages(output) if m['type'] == 'RECORD']
+        self.assertEqual(records[0], {'id': 1, 'at': '2023-01-01T00:00:00.000000Z'})
+
+    def test_state_is_checkpointed_in_batches(self):
+        records = [{'id': i, 'at': '2023-01-01T00:00:00Z'} for i in range(5)]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            sync.sync_stream({}, build_instance(records), sync.Checkpointer(every_records=2))
+
+        types = [m['type'] for m in messages(output)]
+        self.assertEqual(types.count('RECORD'), 5)
+        self.assertEqual(types.count('STATE'), 2)
+
+    def test_pending_state_is_written_on_error(self):
+        instance = build_instance([])
+
+        def failing_sync(state):
+            yield (instance.stream, {'id': 1})
+            raise RuntimeError('boom')
+
+        instance.sync = failing_sync
+        output = io.StringIO()
+        with redirect_stdout(output), self.assertRaises(RuntimeError):
+            sync.sync_stream({}, instance, sync.Checkpointer(every_records=100))
+        self.assertEqual([m['type'] for m in messages(output)], ['RECORD', 'STATE'])
+
+
+class RecordingWriter():
+    def __init__(self):
+        self.messages = []
+
+    def write_schema(self, stream_name, schema, key_properties):
+        self.messages.append(('SCHEMA', stream_name))
+
+    def write_record(self, stream_name, record):
+        self.messages.append(('RECORD', stream_name))
+
+    def write_state(self, state):
+        self.messages.append(('STATE', copy.deepcopy(state)))
+
+    def flush(self):
+        pass
+
+
+class TestSyncConcurrently(unittest.TestCase):
+    def test_streams_share_one_ordered_writer(self):
+        # Both streams must be running at once to get past the barrier.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def task(name):
+            def run(state, writer):
+                writer.write_schema(name, {}, ['id'])
+                barrier.wait()
+                for i in range(3):
+                    writer.write_record(name, {'id': i})
+                singer.write_bookmark(state, name, 'at', '2023-01-02')
+                writer.write_state(state)
+            return run
+
+        state = {'bookmarks': {'a': {'at': '2023-01-01'}}}
+        writer = RecordingWriter()
+        sync.sync_concurrently(state, [('a', task('a')), ('b', task('b'))], writer, max_workers=2)
+
+        self.assertEqual(state, {'bookmarks': {'a': {'at': '2023-01-02'}, 'b': {'at': '2023-01-02'}}})
+        for name in ('a', 'b'):
+            positions = [i for i, message in enumerate(writer.messages) if message[1] == name]
+            self.assertEqual(writer.messages[positions[0]][0], 'SCHEMA')
+            self.assertEqual(len(positions), 4)
+            # No STATE claims a stream's bookmark before its records were written.
+            for i, message in enumerate(writer.messages):
+                if message[0] == 'STATE' and message[1]['bookmarks'].get(name, {}).get('at') == '2023-01-02':
+                    self.assertGreater(i, positions[-1])
+
+    def test_a_failing_stream_stops_the_sync(self):
+        def failing(state, writer):
+            raise RuntimeError('boom')
+
+        def endless(state, writer):
+            while True:
+                writer.write_record('b', {'id': 1})
+
+        with self.assertRaises(RuntimeError):
+            sync.sync_concurrently({}, [('a', failing), ('b', endless)], RecordingWriter(), max_workers=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,9 +9,14 @@ import tap_toggl.streams as streams
 
 from tap_toggl.streams import Stream
 from tap_toggl.toggl import Toggl
-from singer.catalog import Catalog
+from singer import metadata
+from singer.catalog import Catalog, CatalogEntry
 from singer.schema import Schema
-from singer.utils import strftime
+from singer.utils import strftime, strptime_with_tz
+from tap_toggl import dates
+from tap_toggl.dates import parse_datetime, format_datetime
+from tap_toggl.discover import discover_streams
+from unittest import mock
 
 
 class TestStreams(unittest.TestCase):
@@ -39,6 +44,138 @@ class TestStreams(unittest.TestCase):
         CurrentTimestamp.replication_key = "createdAt"
         self.assertFalse(Stream.is_bookmark_old(CurrentTimestamp, bookmarks, now))
 
+    def test_bookmark_is_parsed_once(self):
+        state = {"bookmarks": {"clients": {"at": "2023-01-01T00:00:00+00:00"}}}
+        clients = streams.Clients()
+        with mock.patch.object(streams, 'parse_datetime', wraps=streams.parse_datetime) as parse:
+            self.assertTrue(clients.is_bookmark_old(state, "2023-01-02T00:00:00Z"))
+            self.assertFalse(clients.is_bookmark_old(state, "2023-01-01T01:00:00+02:00"))
+        self.assertEqual(parse.call_count, 3)
+
+        state["bookmarks"]["clients"]["at"] = "2023-01-03T00:00:00Z"
+        self.assertFalse(clients.is_bookmark_old(state, "2023-01-02T00:00:00Z"))
+
+    def test_time_entries_progress_is_dropped_once_the_stream_completes(self):
+        state = {"bookmarks": {"time_entries": {"progress": {"start_date": "2023-01-01", "workspaces": {}}}}}
+        client = mock.Mock()
+
+        def time_entries(column_name, bookmark):
+            self.assertIs(client.report_progress, state["bookmarks"]["time_entries"]["progress"])
+            yield {"id": 1, "updated": "2023-01-02T00:00:00Z"}
+
+        client.time_entries = time_entries
+        instance = streams.TimeEntries(client)
+        self.assertEqual(len(list(instance.sync(state))), 1)
+        self.assertEqual(state["bookmarks"]["time_entries"]["updated"], "2023-01-02T00:00:00Z")
+        self.assertNotIn("progress", state["bookmarks"]["time_entries"])
+
+    def test_time_entries_are_deduplicated_within_a_run(self):
+        client = mock.Mock()
+        client.time_entries.return_value = iter([
+            {"id": 1, "updated": "2023-01-02T00:00:00Z"},
+            {"id": 2, "updated": "2023-01-02T00:00:00Z"},
+            {"id": 1, "updated": "2023-01-02T00:00:00Z"},
+        ])
+        instance = streams.TimeEntries(client)
+        self.assertEqual([item["id"] for _, item in instance.sync({})], [1, 2])
+
+    def test_records_are_trimmed_to_selected_fields(self):
+        client = mock.Mock()
+        client.clients.return_value = iter([{"id": 1, "name": "Client", "wid": 7, "at": "2023-01-02T00:00:00Z"}])
+        instance = streams.Clients(client)
+        mdata = metadata.write(metadata.to_map(instance.load_metadata()), ("properties", "name"), "selected", False)
+        instance.stream = CatalogEntry(tap_stream_id="clients", stream="clients",
+                                       schema=Schema.from_dict(instance.load_schema()), metadata=metadata.to_list(mdata))
+        self.assertEqual([item for _, item in instance.sync({})],
+                         [{"id": 1, "wid": 7, "at": "2023-01-02T00:00:00Z"}])
+
+    def test_changed_time_entries_survive_deduplication_with_a_catalog(self):
+        client = mock.Mock()
+        client.time_entries.return_value = iter([
+            {"id": 1, "description": "a", "updated": "2023-01-02T00:00:00Z"},
+            {"id": 1, "description": "a", "updated": "2023-01-02T00:00:00Z"},
+            {"id": 1, "description": "b", "updated": "2023-01-05T00:00:00Z"}])
+        instance = streams.TimeEntries(client)
+        instance.stream = CatalogEntry(tap_stream_id="time_entries", stream="time_entries",
+                                       schema=Schema.from_dict(instance.load_schema()), metadata=instance.load_metadata())
+        state = {}
+        self.assertEqual([item["description"] for _, item in instance.sync(state)], ["a", "b"])
+        self.assertEqual(state["bookmarks"]["time_entries"]["updated"], "2023-01-05T00:00:00Z")
+
+    def test_time_entries_projection_keeps_the_replication_key(self):
+        client = mock.Mock()
+        client.time_entries.return_value = iter([
+            {"id": 1, "description": "a", "tags": ["x"], "updated": "2023-01-02T00:00:00Z"}])
+        instance = streams.TimeEntries(client)
+        mdata = metadata.write(metadata.to_map(instance.load_metadata()), ("properties", "tags"), "selected", False)
+        instance.stream = CatalogEntry(tap_stream_id="time_entries", stream="time_entries",
+                                       schema=Schema.from_dict(instance.load_schema()), metadata=metadata.to_list(mdata))
+        self.assertNotIn("updated", instance.load_schema()["properties"])
+        self.assertEqual([item for _, item in instance.sync({})],
+                         [{"id": 1, "description": "a", "updated": "2023-01-02T00:00:00Z"}])
+
+    def test_users_digest_mode_emits_only_changed_users(self):
+        users = [{"id": 1, "fullname": "Ann"}, {"id": 2, "fullname": "Bob"}]
+        client = mock.Mock()
+        client.users.side_effect = lambda column_name, bookmark: iter([dict(user) for user in users])
+        config = {"users_digest_mode": True, "users_full_refresh_runs": 3}
+        state = {}
+
+        def run():
+            return [item["id"] for _, item in streams.Users(client, config).sync(state)]
+
+        self.assertEqual(run(), [1, 2])
+        self.assertEqual(run(), [])
+        users[1]["fullname"] = "Robert"
+        users.append({"id": 3, "fullname": "Cy"})
+        self.assertEqual(run(), [2, 3])
+        # Third run since the full refresh of the first run.
+        self.assertEqual(run(), [1, 2, 3])
+        self.assertEqual(run(), [])
+        self.assertEqual(set(state["bookmarks"]["users"]["digests"]), {"1", "2", "3"})
+
+    def test_users_are_all_emitted_without_digest_mode(self):
+        client = mock.Mock()
+        client.users.side_effect = lambda column_name, bookmark: iter([{"id": 1}])
+        state = {}
+        for _ in range(2):
+            self.assertEqual(len(list(streams.Users(client).sync(state))), 1)
+        self.assertNotIn("digests", state.get("bookmarks", {}).get("users", {}))
+
+
+class TestDiscover(unittest.TestCase):
+    def test_discovery_reads_each_schema_file_once(self):
+        streams._read_schema.cache_clear()
+        with mock.patch('builtins.open', wraps=open) as opened:
+            catalog = discover_streams()
+            discover_streams()
+        self.assertEqual(len(catalog), len(streams.STREAMS))
+        self.assertEqual(opened.call_count, len(streams.STREAMS))
+
+
+class TestDates(unittest.TestCase):
+    def test_parse_datetime_matches_singer(self):
+        for value in ["2023-01-02T03:04:05Z", "2023-01-02T03:04:05.123+02:00",
+                      "2018-11-02 18:21:26", "2023-01-02T03:04:05.1234Z", "Jan 2 2023"]:
+            self.assertEqual(parse_datetime(value), strptime_with_tz(value))
+
+    def test_repeated_values_are_parsed_once(self):
+        dates._parse_iso.cache_clear()
+        for _ in range(3):
+            parse_datetime("2023-01-02T03:04:05Z")
+        self.assertEqual(dates._parse_iso.cache_info().misses, 1)
+
+    def test_format_datetime_matches_the_transformer(self):
+        from singer.transform import string_to_datetime
+        for value in ["2023-01-02T03:04:05Z", "2023-01-02T03:04:05.123+02:00", "2023-01-02",
+                      "2018-11-02 18:21:26", "2023-01-02T03:04:05.123456-05:30", "Jan 2 2023"]:
+            self.assertEqual(format_datetime(value), string_to_datetime(value))
+
+    def test_needs_parse_to_date(self):
+        self.assertTrue(streams.needs_parse_to_date("2023-01-02T03:04:05Z"))
+        self.assertFalse(streams.needs_parse_to_date("not a date"))
+        self.assertFalse(streams.needs_parse_to_date(5))
+
 
 
 if __name__ == '__main__':
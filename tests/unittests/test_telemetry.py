@@ -0,0 +1,63 @@
+#
+# Module dependencies.
+#
+
+import unittest
+from unittest import mock
+
+import tap_toggl.telemetry as telemetry
+from tap_toggl.telemetry import HttpTelemetry, endpoint_family, workspace_of
+
+
+class TestEndpointFamily(unittest.TestCase):
+    def test_urls_collapse_to_families(self):
+        self.assertEqual(endpoint_family('https://api.track.toggl.com/api/v9/workspaces/42/clients'), 'clients')
+        self.assertEqual(endpoint_family('https://api.track.toggl.com/api/v9/workspaces/42/tasks?page=2'), 'tasks')
+        self.assertEqual(endpoint_family('https://api.track.toggl.com/api/v9/workspaces'), 'workspaces')
+        self.assertEqual(endpoint_family('https://api.track.toggl.com/reports/api/v2/details?workspace_id=4&page=1'),
+                         'reports_v2_details')
+        self.assertEqual(endpoint_family('https://api.track.toggl.com/reports/api/v3/workspace/4/search/time_entries'),
+                         'reports_v3_search')
+
+    def test_workspace_is_read_from_path_or_query(self):
+        self.assertEqual(workspace_of('https://x/api/v9/workspaces/42/tags'), 42)
+        self.assertEqual(workspace_of('https://x/reports/api/v3/workspace/7/search/time_entries'), 7)
+        self.assertEqual(workspace_of('https://x/reports/api/v2/details?workspace_id=9'), 9)
+        self.assertIsNone(workspace_of('https://x/api/v9/me'))
+
+
+class TestHttpTelemetry(unittest.TestCase):
+    def test_requests_are_timed_and_summarised_per_family(self):
+        metrics = HttpTelemetry()
+        with mock.patch.object(telemetry, 'log') as log:
+            metrics.request('https://x/api/v9/workspaces/1/clients', 200, 0.5)
+            metrics.received('https://x/api/v9/workspaces/1/clients', 100)
+            metrics.request('https://x/api/v9/workspaces/2/clients', 429, 0.1)
+            metrics.retry('https://x/api/v9/workspaces/2/clients', 2.0)
+            timers = [call[0][1] for call in log.call_args_list]
+            log.reset_mock()
+            metrics.log_summary()
+            summary = [call[0][1] for call in log.call_args_list]
+
+        self.assertEqual([point.tags['http_status_code'] for point in timers], [200, 429])
+        self.assertEqual(timers[0].tags['workspace_id'], 1)
+        self.assertEqual(timers[1].tags['status'], 'failed')
+
+        values = {(point.metric, point.tags.get('http_status_code')): point.value for point in summary}
+        self.assertEqual(values[('http_request_count', None)], 2)
+        self.assertEqual(values[('http_bytes_received', None)], 100)
+        self.assertEqual(values[('http_retries', None)], 1)
+        self.assertEqual(values[('http_backoff_seconds', None)], 2.0)
+        self.assertEqual(values[('http_status_count', 429)], 1)
+        self.assertTrue(all(point.tags['stream'] == 'clients' for point in summary))
+
+    def test_per_request_timers_can_be_disabled(self):
+        metrics = HttpTelemetry(per_request=False)
+        with mock.patch.object(telemetry, 'log') as log:
+            metrics.request('https://x/api/v9/workspaces/1/clients', 200, 0.5)
+        log.assert_not_called()
+        self.assertEqual(metrics.families['clients']['requests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
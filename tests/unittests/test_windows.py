@@ -0,0 +1,79 @@
+#
+# Module dependencies.
+#
+
+import unittest
+from datetime import datetime
+
+from tap_toggl.windows import ReportProgress, WindowPlanner, merge_ranges
+
+
+class TestWindowPlanner(unittest.TestCase):
+    def test_workspaces_without_history_use_30_day_windows(self):
+        planner = WindowPlanner({})
+        windows = list(planner.plan([1, 2], datetime(2023, 1, 1), datetime(2023, 2, 15)))
+        self.assertEqual(windows, [
+            (1, '2023-01-01', '2023-01-30'), (2, '2023-01-01', '2023-01-30'),
+            (1, '2023-01-31', '2023-03-01'), (2, '2023-01-31', '2023-03-01'),
+        ])
+
+    def test_window_length_follows_density(self):
+        planner = WindowPlanner({'1': 0.5, '2': 100.0}, page_size=50, target_pages=10)
+        self.assertEqual(planner.window_days(1), 365)
+        self.assertEqual(planner.window_days(2), 5)
+
+        windows = list(planner.plan([1, 2], datetime(2023, 1, 1), datetime(2023, 1, 12)))
+        self.assertEqual(len([w for w in windows if w[0] == 1]), 1)
+        self.assertEqual(len([w for w in windows if w[0] == 2]), 3)
+
+    def test_observed_density_is_saved_in_place(self):
+        densities = {'2': 10.0}
+        planner = WindowPlanner(densities)
+        planner.observe(1, 10, 50)
+        planner.observe(2, 10, 300)
+        planner.finish()
+        self.assertEqual(densities, {'1': 5.0, '2': 20.0})
+
+    def test_dense_windows_shrink_the_next_ones(self):
+        planner = WindowPlanner({}, page_size=50, target_pages=10)
+        windows = planner.windows(1, datetime(2023, 1, 1), datetime(2023, 3, 1))
+        first = next(windows)
+        self.assertEqual(first, (1, '2023-01-01', '2023-01-30'))
+        # 3,000 rows over 30 days is six times the target of 500 rows per window.
+        planner.observe_window(first, 3000)
+        self.assertEqual(next(windows), (1, '2023-01-31', '2023-02-04'))
+
+    def test_covered_ranges_are_not_planned_again(self):
+        planner = WindowPlanner({})
+        covered = {1: [('2023-01-01', '2023-01-10'), ('2023-01-21', '2023-01-31')]}
+        windows = list(planner.plan([1], datetime(2023, 1, 1), datetime(2023, 2, 15), covered=covered))
+        self.assertEqual(windows, [(1, '2023-01-11', '2023-01-20'), (1, '2023-02-01', '2023-03-02')])
+
+
+class TestReportProgress(unittest.TestCase):
+    def test_pages_and_windows_are_recorded(self):
+        state = {}
+        progress = ReportProgress(state, '2023-01-01')
+        progress.page_done((1, '2023-01-01', '2023-01-31'), 3)
+        progress.page_done((1, '2023-01-31', '2023-03-02'), 2)
+        progress.window_done((1, '2023-01-31', '2023-03-02'))
+        self.assertEqual(state, {'start_date': '2023-01-01', 'workspaces': {'1': {
+            'completed': [['2023-01-31', '2023-03-02']], 'pending': {'2023-01-01/2023-01-31': 3}}}})
+        self.assertEqual(progress.pending(), [((1, '2023-01-01', '2023-01-31'), 3)])
+
+        progress.window_done((1, '2023-01-01', '2023-01-31'))
+        self.assertEqual(state['workspaces']['1']['completed'], [['2023-01-01', '2023-03-02']])
+
+    def test_progress_for_another_range_is_discarded(self):
+        state = {'start_date': '2022-12-01', 'workspaces': {'1': {'completed': [['2022-12-01', '2022-12-31']], 'pending': {}}}}
+        progress = ReportProgress(state, '2023-01-01')
+        self.assertEqual(progress.covered(1), [])
+        self.assertEqual(state, {'start_date': '2023-01-01', 'workspaces': {}})
+
+    def test_adjacent_ranges_are_merged(self):
+        self.assertEqual(merge_ranges([('2023-01-05', '2023-01-09'), ('2023-01-01', '2023-01-04'), ('2023-02-01', '2023-02-02')]),
+                         [['2023-01-01', '2023-01-09'], ['2023-02-01', '2023-02-02']])
+
+
+if __name__ == '__main__':
+    unittest.main()